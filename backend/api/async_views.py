@@ -0,0 +1,44 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    Выполняет view и отрисовывает ответ в потоке из пула. У потока
+    свои соединения с БД, поэтому, как на границах запроса в Django,
+    устаревшие закрываются до и после, а соединения пула
+    (foodgram.db) возвращаются в него.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Асинхронная обёртка view из роутера DRF для ASGI.
+
+    В Django 3.2 нет асинхронного ORM и кэша, поэтому чтение
+    (SAFE_METHODS) выполняется целиком в пуле потоков
+    (sync_to_async с thread_sensitive=False), и запросы одного
+    процесса идут параллельно, а не по очереди через общий поток,
+    как обычные view под ASGI. Запись остаётся в общем потоке.
+    """
+    read = sync_to_async(run_view, thread_sensitive=False)
+    write = sync_to_async(view)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return async_view
@@ -0,0 +1,138 @@
+import copy
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# В ключе хранится хэш токена, а не сам токен, чтобы токены
+# не попадали в ключи и статистику общего кэша.
+TOKEN_KEY = 'auth-token:{}'
+
+# Значение ключа отозванного токена.
+REVOKED = 'revoked'
+
+
+def _token_key(key):
+    return TOKEN_KEY.format(sha256(key.encode()).hexdigest())
+
+
+def _without_password(token):
+    """
+    Копия токена для кэша: у пользователя нет хэша пароля, поле
+    password отложено и при обращении читается из БД.
+    """
+    user = copy.copy(token.user)
+    del user.__dict__['password']
+    token = copy.copy(token)
+    token.user = user
+    return token
+
+
+class TokenLRU:
+    """
+    Локальный кэш процесса: токен -> сериализованный Token с
+    пользователем. Записи живут AUTH_TOKEN_LOCAL_TIMEOUT секунд,
+    при переполнении вытесняются самые давно использованные.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # Каждому запросу своя копия: view могут менять request.user.
+        return pickle.loads(data)
+
+    def set(self, key, token):
+        timeout = settings.AUTH_TOKEN_LOCAL_TIMEOUT
+        if timeout <= 0:
+            return
+        data = pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (data, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+local_tokens = TokenLRU()
+
+
+def invalidate_tokens(keys):
+    """
+    Убирает токены из общего и локального кэша после фиксации
+    транзакции. Остальные процессы перестают принимать токен
+    не позже чем через AUTH_TOKEN_LOCAL_TIMEOUT секунд: их общий кэш
+    тот же, а если кэш default у каждого процесса свой, токены в нём
+    не хранятся (SHARED_CACHE).
+
+    В общем кэше вместо токена на AUTH_TOKEN_REVOKED_TIMEOUT секунд
+    остаётся метка REVOKED: запрос, который прочитал токен из БД
+    до отзыва, кладёт его через cache.add и не перезапишет метку.
+    """
+    cache_keys = [_token_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def delete():
+        cache.set_many(
+            dict.fromkeys(cache_keys, REVOKED),
+            settings.AUTH_TOKEN_REVOKED_TIMEOUT)
+        for key in cache_keys:
+            local_tokens.delete(key)
+
+    transaction.on_commit(delete)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса Token + User к БД на каждый вызов
+    API: найденный токен с пользователем хранится в общем кэше
+    AUTH_TOKEN_CACHE_TIMEOUT секунд и в локальном LRU процесса.
+    Если кэш default не общий, другие процессы не узнали бы из него
+    об отзыве токена, поэтому остаётся только LRU.
+
+    Кэш сбрасывается при удалении токена (выход через
+    auth/token/logout) и при сохранении пользователя, в том числе
+    при смене пароля и деактивации (api.signals). Хэш пароля
+    в кэш не попадает (_without_password).
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_key(key)
+        token = local_tokens.get(cache_key)
+        if token is not None:
+            return token.user, token
+        token = cache.get(cache_key) if settings.SHARED_CACHE else None
+        if not isinstance(token, Token):
+            # Неверный токен или неактивный пользователь - исключение,
+            # в кэш попадают только принятые токены.
+            _, token = super().authenticate_credentials(key)
+            token = _without_password(token)
+            if settings.SHARED_CACHE and not cache.add(
+                    cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT):
+                # Токен отозван, пока его читали из БД, или его уже
+                # положил другой запрос.
+                return token.user, token
+        local_tokens.set(cache_key, token)
+        return token.user, token
@@ -0,0 +1,96 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag
+)
+from django.utils.http import http_date
+
+from api.response_cache import (
+    accepts_gzip, cache_response, get_cached_response
+)
+from recipes.versions import get_last_modified, get_version
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list и retrieve. Валидаторы считаются
+    по версиям таблиц version_models без сериализации, и на совпавший
+    If-None-Match или If-Modified-Since сразу отдаётся 304.
+
+    Если is_cacheable(), отрисованный ответ хранится в кэше responses
+    под ключом из тех же валидаторов: запись в таблицу меняет её версию,
+    и старые ответы больше не находятся.
+    """
+
+    version_models = ()
+    vary_headers = ()
+    cache_responses = False
+
+    def is_cacheable(self):
+        return self.cache_responses
+
+    def get_version_models(self):
+        return self.version_models
+
+    def get_last_write(self):
+        return max(
+            (get_last_modified(model) for model in self.get_version_models()),
+            default=None)
+
+    def get_validators(self):
+        """Части ETag и время изменения ответа (unix timestamp)."""
+        models = self.get_version_models()
+        parts = [
+            self.request.build_absolute_uri(),
+            self.request.accepted_media_type,
+        ]
+        parts.extend(get_version(model) for model in models)
+        last_modified = max(
+            (get_last_modified(model) for model in models), default=None)
+        return parts, last_modified
+
+    def conditional_response(self, parts, last_modified, get_response):
+        cacheable = self.is_cacheable()
+        use_gzip = cacheable and accepts_gzip(self.request)
+        key = md5('|'.join(map(str, parts)).encode()).hexdigest()
+        etag = quote_etag(key + ('-gzip' if use_gzip else ''))
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified)
+        if response is None and cacheable:
+            response = get_cached_response(key, use_gzip)
+        if response is None:
+            response = get_response()
+            if response.status_code != 200:
+                return response
+            if cacheable:
+                response = cache_response(
+                    key, self.render(response), use_gzip)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        vary_headers = self.vary_headers
+        if cacheable and settings.RESPONSE_CACHE_GZIP:
+            vary_headers += ('Accept-Encoding',)
+        if vary_headers:
+            patch_vary_headers(response, vary_headers)
+        return response
+
+    def render(self, response):
+        """Отрисовывает ответ DRF заранее, чтобы сохранить его тело."""
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        return response.render()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            *self.get_validators(),
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            *self.get_validators(),
+            lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch, prefetch_related_objects
+
+from recipes.models import AmountIngredient, Ingredient, Tag
+from recipes.versions import get_version, get_versions
+from users.models import User
+
+# Документ рецепта - общая для всех пользователей часть ответа.
+# Ключ меняется вместе с рецептом (updated_at), таблицами тегов и
+# ингредиентов и профилем автора, поэтому после записи документ
+# пересобирается при следующем чтении.
+DOCUMENT_KEY = 'recipe-document:{}:{}:{}:{}:{}'
+
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch(
+        'recipe_ingredient',
+        queryset=AmountIngredient.objects.select_related('ingredient')
+    ),
+)
+
+
+def get_documents(recipes, serializer_class):
+    """
+    Документы рецептов в том же порядке. Недостающие собираются
+    serializer_class, связи для них загружаются одним prefetch.
+    """
+    tag_version = get_version(Tag)
+    ingredient_version = get_version(Ingredient)
+    author_versions = get_versions(
+        User, {recipe.author_id for recipe in recipes})
+    keys = [
+        DOCUMENT_KEY.format(
+            recipe.pk, recipe.updated_at.timestamp(), tag_version,
+            ingredient_version, author_versions[recipe.author_id])
+        for recipe in recipes
+    ]
+    cache = caches['documents']
+    documents = cache.get_many(keys)
+    missing = [
+        (key, recipe) for key, recipe in zip(keys, recipes)
+        if key not in documents
+    ]
+    if missing:
+        prefetch_related_objects(
+            [recipe for _, recipe in missing], *RECIPE_PREFETCH)
+        serializer = serializer_class()
+        built = {
+            key: serializer.to_representation(recipe)
+            for key, recipe in missing
+        }
+        cache.set_many(built, settings.DOCUMENT_CACHE_TIMEOUT)
+        documents.update(built)
+    return [documents[key] for key in keys]
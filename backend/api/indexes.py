@@ -0,0 +1,61 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся отсортированными и приведёнными к casefold, поиск
+    по префиксу выполняется бинарным поиском. Индекс перестраивается,
+    когда меняется версия таблицы Ingredient.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._index = (None, [], [])
+
+    def _build(self, version):
+        rows = sorted(
+            (
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for pk, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit').iterator()
+            ),
+            key=lambda row: (row['name'].casefold(), row['name'], row['id'])
+        )
+        keys = [row['name'].casefold() for row in rows]
+        self._index = (version, keys, rows)
+
+    def _refresh(self):
+        version = get_version(Ingredient)
+        if version != self._index[0]:
+            with self._lock:
+                if version != self._index[0]:
+                    self._build(version)
+        return self._index[1:]
+
+    def search(self, name=''):
+        """
+        Ингредиенты, название которых начинается с name, а за ними
+        ингредиенты, название которых содержит name.
+        """
+        keys, rows = self._refresh()
+        query = name.casefold()
+        if not query:
+            return list(rows)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        contains = [
+            rows[i] for i, key in enumerate(keys)
+            if query in key and not start <= i < end
+        ]
+        return rows[start:end] + contains
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,138 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from time import perf_counter
+
+from rest_framework import serializers
+
+from api.profiling import ProfiledViewMixin
+
+# Замеры текущего запроса; None, если инструментирование выключено.
+current_timings = ContextVar('current_timings', default=None)
+
+# Обёртки connection.execute_wrapper() текущего запроса. Контекст
+# переходит в потоки sync_to_async, поэтому запросы считаются, в каком
+# бы потоке ни выполнялись, в том числе под ASGI (api.async_views).
+query_wrappers = ContextVar('query_wrappers', default=())
+
+
+def call_query_wrappers(execute, sql, params, many, context):
+    """Постоянная обёртка соединений (api.signals)."""
+    for wrapper in reversed(query_wrappers.get()):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def observe_queries(wrapper):
+    """Подключает wrapper ко всем запросам к БД внутри блока."""
+    token = query_wrappers.set(query_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        query_wrappers.reset(token)
+
+
+class RequestTimings:
+    """Время, потраченное запросом на БД, сериализаторы и view."""
+
+    def __init__(self):
+        self.action = None
+        self.queries = Counter()
+        self.db = 0
+        self.serializer = 0
+        self.view = 0
+        self.total = 0
+        self.in_serializer = False
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        """SQL-запросы, выполненные больше одного раза."""
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.queries.most_common() if count > 1
+        ]
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обёртка для observe_queries()."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - started
+            self.queries[sql] += 1
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.query_count} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'view;dur={self.view * 1000:.1f};desc="{self.action}"',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'total_ms': round(self.total * 1000, 1),
+            'view_ms': round(self.view * 1000, 1),
+            'db_ms': round(self.db * 1000, 1),
+            'serializer_ms': round(self.serializer * 1000, 1),
+            'queries': self.query_count,
+            'duplicates': self.duplicates(),
+        }
+
+
+class InstrumentedViewMixin(ProfiledViewMixin):
+    """
+    Замеряет время view и подписывает запрос именем действия viewset,
+    по запросу сотрудника профилирует его (api.profiling).
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        timings = current_timings.get()
+        if timings is None:
+            return super().dispatch(request, *args, **kwargs)
+        started = perf_counter()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            timings.view = perf_counter() - started
+            timings.action = '{}.{}'.format(
+                type(self).__name__,
+                getattr(self, 'action', None) or request.method.lower())
+
+
+class InstrumentedSerializerMixin:
+    """
+    Суммирует время сериализации и валидации. Вложенные сериализаторы
+    учитываются во времени внешнего.
+    """
+
+    def to_representation(self, instance):
+        return self._timed(super().to_representation, instance)
+
+    def run_validation(self, data=serializers.empty):
+        return self._timed(super().run_validation, data)
+
+    @staticmethod
+    def _timed(method, *args):
+        timings = current_timings.get()
+        if timings is None or timings.in_serializer:
+            return method(*args)
+        timings.in_serializer = True
+        started = perf_counter()
+        try:
+            return method(*args)
+        finally:
+            timings.serializer += perf_counter() - started
+            timings.in_serializer = False
+
+
+class InstrumentedModelSerializer(InstrumentedSerializerMixin,
+                                  serializers.ModelSerializer):
+    """ModelSerializer с замером времени сериализации."""
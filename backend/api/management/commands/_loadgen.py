@@ -0,0 +1,164 @@
+"""
+Генератор HTTP-нагрузки для manage.py benchmark. Подчёркивание
+в имени модуля не даёт Django считать его командой.
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+# Секунды, после которых запрос считается ошибкой.
+REQUEST_TIMEOUT = 30
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """Минимальный HTTP/1.1 клиент с keep-alive поверх asyncio."""
+
+    def __init__(self, base_url, headers=None):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.headers = {
+            'Host': url.netloc,
+            'Connection': 'keep-alive',
+            **(headers or {}),
+        }
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, body=b'', headers=None):
+        """Возвращает (статус, тело ответа)."""
+        if self.writer is None:
+            await self.open()
+        headers = {**self.headers, **(headers or {})}
+        headers['Content-Length'] = str(len(body))
+        head = ''.join(
+            f'{name}: {value}\r\n' for name, value in headers.items())
+        self.writer.write(
+            f'{method} {path} HTTP/1.1\r\n{head}\r\n'.encode('latin-1')
+            + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise HTTPError('Соединение закрыто сервером')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get('transfer-encoding') == 'chunked':
+            content = await self.read_chunked()
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(
+                int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            await self.close()
+        if response_headers.get('connection') == 'close':
+            await self.close()
+        return status, content
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+
+async def slow_client(base_url, interval=1):
+    """
+    Клиент, который шлёт заголовки запроса по байту в interval секунд
+    и никогда не заканчивает, как медленная мобильная сеть. Синхронный
+    воркер занят им до своего timeout, асинхронный - нет.
+    """
+    url = urlsplit(base_url)
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(
+                url.hostname, url.port or 80)
+        except OSError:
+            await asyncio.sleep(interval)
+            continue
+        try:
+            writer.write(
+                f'GET /api/tags/ HTTP/1.1\r\nHost: {url.netloc}\r\n'
+                f'X-Slow-Client: '.encode('latin-1'))
+            while not reader.at_eof():
+                await writer.drain()
+                await asyncio.sleep(interval)
+                writer.write(b'a')
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+
+async def run_load(base_url, make_request, total, concurrency, headers=None,
+                   slow_clients=0):
+    """
+    Выполняет total запросов в concurrency соединений, пока ещё
+    slow_clients соединений держат медленные клиенты. make_request(i)
+    возвращает (метод, путь, тело, заголовки). Возвращает задержки
+    в секундах, число ошибок и общее время.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        connection = Connection(base_url, headers)
+        try:
+            for i in counter:
+                method, path, body, extra_headers = make_request(i)
+                started = time.perf_counter()
+                try:
+                    status, _ = await asyncio.wait_for(
+                        connection.request(method, path, body, extra_headers),
+                        REQUEST_TIMEOUT)
+                except (OSError, HTTPError, asyncio.IncompleteReadError,
+                        asyncio.TimeoutError):
+                    errors += 1
+                    await connection.close()
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+        finally:
+            await connection.close()
+
+    slow = [
+        asyncio.create_task(slow_client(base_url))
+        for _ in range(slow_clients)
+    ]
+    if slow:
+        # Медленные клиенты успевают занять соединения до замера.
+        await asyncio.sleep(1)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        for task in slow:
+            task.cancel()
+        await asyncio.gather(*slow, return_exceptions=True)
+    return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.commands._loadgen import run_load
+from recipes.models import (
+    AmountIngredient, Favorite, Ingredient,
+    Recipe, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+RECIPE_PREFIX = 'benchmark'
+RECIPE_INGREDIENTS = 20
+# Картинка 1x1 для создания рецептов.
+IMAGE = (
+    'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///'
+    'yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+)
+SERVER_START_TIMEOUT = 30
+
+
+def recipe_payload(context, i):
+    return {
+        'name': f'{RECIPE_PREFIX} {i}',
+        'text': 'Рецепт для замеров',
+        'cooking_time': 10 + i % 50,
+        'image': IMAGE,
+        'tags': context['tag_ids'],
+        'ingredients': [
+            {'id': pk, 'amount': 1 + (i + j) % 100}
+            for j, pk in enumerate(context['ingredient_ids'])
+        ],
+    }
+
+
+def update_payload(context, i):
+    payload = recipe_payload(context, i)
+    del payload['image']
+    return payload
+
+
+def ingredient_search(context, i):
+    prefixes = context['prefixes']
+    return f'/api/ingredients/?name={quote(prefixes[i % len(prefixes)])}'
+
+
+# Сценарий -> (метод, адрес или функция от (context, i), тело запроса).
+SCENARIOS = {
+    'recipes-list': ('GET', '/api/recipes/?limit=6', None),
+    'recipes-list-tags': (
+        'GET', '/api/recipes/?limit=6&tags={tag_slugs}', None),
+    'recipes-list-author': (
+        'GET', '/api/recipes/?limit=6&author={author}', None),
+    'recipes-list-favorited': (
+        'GET', '/api/recipes/?limit=6&is_favorited=1', None),
+    'recipes-list-in-cart': (
+        'GET', '/api/recipes/?limit=6&is_in_shopping_cart=1', None),
+    'recipes-detail': ('GET', '/api/recipes/{recipe}/', None),
+    'recipes-create': ('POST', '/api/recipes/', recipe_payload),
+    'recipes-update': ('PATCH', '/api/recipes/{own_recipe}/', update_payload),
+    'users-subscriptions': (
+        'GET', '/api/users/subscriptions/?limit=6&recipes_limit=3', None),
+    'ingredients-search': ('GET', ingredient_search, None),
+    'recipes-download-shopping-cart': (
+        'GET', '/api/recipes/download_shopping_cart/', None),
+}
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 0.5)),
+        'p90_ms': ms(percentile(latencies, 0.9)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency percentiles, throughput and SQL queries of the '
+        'main API routes in-process or over HTTP and writes them to JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('inprocess', 'http'), default='inprocess')
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера для режима http.')
+        parser.add_argument(
+            '--spawn', action='store_true',
+            help='Запустить gunicorn на свободном порту для режима http.')
+        parser.add_argument('--gunicorn-workers', type=int, default=2)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Число одновременных соединений в режиме http.')
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Соединения медленных клиентов, открытые во время '
+                 'замеров в режиме http.')
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help='Запустить только указанные сценарии.')
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого идут запросы.')
+        parser.add_argument(
+            '--generate', action='store_true',
+            help='Заполнить пустую базу через load_data '
+                 'и generate_fake_data.')
+        parser.add_argument('--seed', default='foodgram')
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+        parser.add_argument(
+            '--compare',
+            help='Файл с прошлыми результатами для сравнения.')
+        parser.add_argument(
+            '--max-regression', type=float, default=0.2,
+            help='Допустимый рост p50 относительно --compare.')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'http' and not (
+                options['url'] or options['spawn']):
+            raise CommandError('Для режима http нужен --url или --spawn')
+        if options['generate'] and not Recipe.objects.exists():
+            call_command('load_data')
+            call_command('generate_fake_data', seed=options['seed'])
+        setup_test_environment()
+        context = self.prepare(options['user'])
+        scenarios = options['scenario'] or list(SCENARIOS)
+        try:
+            if options['mode'] == 'inprocess':
+                results = self.run_inprocess(context, scenarios, options)
+            else:
+                results = self.run_http(context, scenarios, options)
+        finally:
+            self.cleanup(context['user'])
+        report = {'meta': self.meta(options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(report, options['compare'],
+                         options['max_regression'])
+
+    def prepare(self, email):
+        """Пользователь, токен и идентификаторы для адресов сценариев."""
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user_id = (
+                ShoppingCart.objects.values('user')
+                .annotate(total=Count('id')).order_by('-total', 'user')
+                .values_list('user', flat=True).first()
+            )
+            user = User.objects.filter(id=user_id).first() if user_id else (
+                User.objects.order_by('id').first())
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        if user is None or recipe is None:
+            raise CommandError('Нет данных для замеров: запустите '
+                               'generate_fake_data или укажите --generate')
+        tags = list(Tag.objects.order_by('id')[:2])
+        names = Ingredient.objects.values_list('name', flat=True)
+        prefixes = sorted({name[:2].lower() for name in names if name})
+        context = {
+            'user': user,
+            'token': Token.objects.get_or_create(user=user)[0].key,
+            'recipe': recipe.id,
+            'author': User.objects.order_by('-recipes_count', 'id')
+                                  .values_list('id', flat=True).first(),
+            'tag_ids': [tag.id for tag in tags],
+            'tag_slugs': '&tags='.join(tag.slug for tag in tags),
+            'ingredient_ids': list(
+                Ingredient.objects.order_by('id')
+                .values_list('id', flat=True)[:RECIPE_INGREDIENTS]),
+            'prefixes': prefixes[::max(1, len(prefixes) // 20)],
+        }
+        response = self.client(context).post(
+            '/api/recipes/', recipe_payload(context, 0), format='json')
+        if response.status_code != 201:
+            raise CommandError(
+                f'Не удалось создать рецепт для замеров: {response.data}')
+        context['own_recipe'] = response.data['id']
+        return context
+
+    def client(self, context):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {context["token"]}')
+        return client
+
+    def cleanup(self, user):
+        for recipe in Recipe.objects.filter(
+                author=user, name__startswith=RECIPE_PREFIX):
+            recipe.image.delete(save=False)
+            recipe.delete()
+
+    def build(self, context, scenario, i):
+        """Метод, путь и тело i-го запроса сценария."""
+        method, url, payload = SCENARIOS[scenario]
+        path = url(context, i) if callable(url) else url.format(**context)
+        return method, path, payload(context, i) if payload else None
+
+    def count_queries(self, client, context, scenario):
+        method, path, data = self.build(context, scenario, 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.request(client, method, path, data)
+        return len(queries)
+
+    def request(self, client, method, path, data):
+        response = client.generic(
+            method, path, json.dumps(data) if data else '',
+            content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def run_inprocess(self, context, scenarios, options):
+        client = self.client(context)
+        results = {}
+        for scenario in scenarios:
+            queries = self.count_queries(client, context, scenario)
+            for i in range(options['warmup']):
+                self.request(client, *self.build(context, scenario, i))
+            latencies, errors = [], 0
+            started = time.perf_counter()
+            for i in range(options['requests']):
+                request = self.build(context, scenario, i)
+                request_started = time.perf_counter()
+                status = self.request(client, *request)
+                latencies.append(time.perf_counter() - request_started)
+                errors += status >= 400
+            results[scenario] = {
+                **summarize(latencies, errors,
+                            time.perf_counter() - started),
+                'queries': queries,
+            }
+            self.print_result(scenario, results[scenario])
+        return results
+
+    def run_http(self, context, scenarios, options):
+        server = None
+        url = options['url']
+        if options['spawn']:
+            server, url = self.spawn_server(options['gunicorn_workers'])
+        url = url.rstrip('/')
+        client = self.client(context)
+        headers = {
+            'Authorization': f'Token {context["token"]}',
+            'Content-Type': 'application/json',
+        }
+
+        def make_request(scenario):
+            def make(i):
+                method, path, data = self.build(context, scenario, i)
+                body = json.dumps(data).encode() if data else b''
+                return method, path, body, None
+            return make
+
+        results = {}
+        try:
+            for scenario in scenarios:
+                queries = self.count_queries(client, context, scenario)
+                make = make_request(scenario)
+                asyncio.run(run_load(
+                    url, make, options['warmup'],
+                    options['concurrency'], headers))
+                latencies, errors, elapsed = asyncio.run(run_load(
+                    url, make, options['requests'],
+                    options['concurrency'], headers,
+                    options['slow_clients']))
+                results[scenario] = {
+                    **summarize(latencies, errors, elapsed),
+                    'queries': queries,
+                }
+                self.print_result(scenario, results[scenario])
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+        return results
+
+    def spawn_server(self, workers):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn',
+             '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+             '--bind', f'127.0.0.1:{port}', '--workers', str(workers)],
+            cwd=settings.BASE_DIR,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn завершился при запуске')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('gunicorn не запустился вовремя')
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': commit,
+            'mode': options['mode'],
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'concurrency': (
+                options['concurrency'] if options['mode'] == 'http' else 1),
+            'slow_clients': (
+                options['slow_clients'] if options['mode'] == 'http' else 0),
+            'worker_class': (
+                os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+                if options['spawn'] else None),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'dataset': {
+                model._meta.model_name: model.objects.count()
+                for model in (User, Recipe, Ingredient, Tag, AmountIngredient,
+                              Favorite, ShoppingCart, Subscription)
+            },
+        }
+
+    def print_result(self, scenario, result):
+        self.stdout.write(
+            '{:<32} p50 {p50_ms} ms, p99 {p99_ms} ms, {rps} rps, '
+            '{queries} SQL, ошибок {errors}'.format(scenario, **result))
+
+    def compare(self, report, path, max_regression):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['meta']['mode'] != report['meta']['mode']:
+            self.stdout.write(self.style.WARNING(
+                'Сравниваются замеры в разных режимах: {} и {}'.format(
+                    baseline['meta']['mode'], report['meta']['mode'])))
+        regressions = []
+        for scenario, result in report['results'].items():
+            old = baseline['results'].get(scenario)
+            if not old or not old['p50_ms'] or not result['p50_ms']:
+                continue
+            change = result['p50_ms'] / old['p50_ms'] - 1
+            message = '{}: p50 {} -> {} ms ({:+.0%}), SQL {} -> {}'.format(
+                scenario, old['p50_ms'], result['p50_ms'], change,
+                old['queries'], result['queries'])
+            if change > max_regression or result['queries'] > old['queries']:
+                regressions.append(scenario)
+                self.stdout.write(self.style.ERROR(message))
+            else:
+                self.stdout.write(message)
+        if regressions:
+            raise CommandError(
+                'Регрессия производительности: {}'.format(
+                    ', '.join(regressions)))
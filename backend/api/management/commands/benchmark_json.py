@@ -0,0 +1,119 @@
+import timeit
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from users.models import User
+
+# Типы, которые orjson сам пишет иначе, чем JSONRenderer.
+TYPES = {
+    'decimal': Decimal('12.50'),
+    'aware': datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=timezone.utc),
+    'naive': datetime(2024, 5, 6, 7, 8, 9, 123456),
+    'date': date(2024, 5, 6),
+    'time': time(7, 8, 9, 123456),
+    'timedelta': timedelta(hours=1, microseconds=5),
+    'lazy': gettext_lazy('Рецепт'),
+    'error': ErrorDetail('Обязательное поле.', code='required'),
+    'uuid': UUID('12345678-1234-5678-1234-567812345678'),
+    'separators': 'a\u2028b\u2029c',
+    'float': 0.1,
+    'nested': [{'id': 1, 'amount': Decimal('0.5')}],
+}
+
+# Значения, на которых FastJSONRenderer переходит на стандартный json.
+FALLBACKS = {
+    'big': 2 ** 70,
+    'tiny': 1e-7,
+    'huge': 1e22,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares DRF JSONRenderer and JSONParser with their orjson '
+        'versions on a page of RecipeReadSerializer output and checks '
+        'that the rendered bytes are identical.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Рецептов на странице.')
+        parser.add_argument(
+            '--number', type=int, default=200,
+            help='Повторов каждого замера.')
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого запрашивается '
+                 'страница.')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен, сравнивается стандартный json '
+                'с самим собой'))
+        page = self.get_page(options['limit'], options['user'])
+        samples = {'page': page, 'types': TYPES, 'fallbacks': FALLBACKS}
+        for name, data in samples.items():
+            expected = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != expected:
+                raise CommandError(
+                    f'FastJSONRenderer отрисовал {name} не так, '
+                    f'как JSONRenderer')
+            if self.parse(FastJSONParser(), expected) != self.parse(
+                    JSONParser(), expected):
+                raise CommandError(
+                    f'FastJSONParser разобрал {name} не так, как JSONParser')
+        content = JSONRenderer().render(page)
+        self.stdout.write(
+            f'{options["limit"]} рецептов, {len(content)} байт')
+        number = options['number']
+        self.report('render', number, (
+            ('JSONRenderer', lambda: JSONRenderer().render(page)),
+            ('FastJSONRenderer', lambda: FastJSONRenderer().render(page)),
+        ))
+        self.report('parse', number, (
+            ('JSONParser', lambda: self.parse(JSONParser(), content)),
+            ('FastJSONParser',
+             lambda: self.parse(FastJSONParser(), content)),
+        ))
+
+    def get_page(self, limit, email):
+        setup_test_environment()
+        users = User.objects.order_by('id')
+        user = users.filter(email=email).first() if email else users.first()
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get('/api/recipes/', {'limit': limit})
+        if response.status_code != 200 or not response.data['results']:
+            raise CommandError('Нет рецептов: запустите generate_fake_data')
+        return response.data
+
+    @staticmethod
+    def parse(parser, content):
+        return parser.parse(
+            BytesIO(content), parser_context={'encoding': 'utf-8'})
+
+    def report(self, operation, number, candidates):
+        baseline = None
+        for name, function in candidates:
+            seconds = min(timeit.repeat(function, number=number, repeat=3))
+            per_call = seconds / number * 1e6
+            baseline = baseline or per_call
+            self.stdout.write(
+                f'{operation:<8} {name:<18} {per_call:10.1f} мкс '
+                f'(x{baseline / per_call:.2f})')
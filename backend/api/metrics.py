@@ -0,0 +1,123 @@
+import os
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess
+)
+
+from foodgram.db.pool import pools
+
+# В режиме нескольких процессов (gunicorn) prometheus_client пишет
+# значения в файлы каталога PROMETHEUS_MULTIPROC_DIR, а /metrics
+# собирает их со всех воркеров.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+LABELS = ('basename', 'action')
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Время обработки запроса.',
+    LABELS + ('method',), buckets=LATENCY_BUCKETS)
+REQUEST_ERRORS = Counter(
+    'foodgram_request_errors_total', 'Ответы с кодом 4xx и 5xx.',
+    LABELS + ('status',))
+DB_QUERIES = Counter(
+    'foodgram_db_queries_total', 'Запросы к БД.', LABELS + ('alias',))
+DB_QUERY_SECONDS = Counter(
+    'foodgram_db_query_seconds_total', 'Время запросов к БД.',
+    LABELS + ('alias',))
+DB_CONNECTIONS = Counter(
+    'foodgram_db_connections_total', 'Открытые соединения с БД.',
+    ('alias', 'vendor'))
+DB_POOL_CONNECTIONS = Gauge(
+    'foodgram_db_pool_connections', 'Соединения пула и ждущие их запросы.',
+    ('alias', 'state'), multiprocess_mode='livesum')
+DB_POOL_WAIT_SECONDS = Counter(
+    'foodgram_db_pool_wait_seconds_total',
+    'Время ожидания соединения из пула.', ('alias',))
+DB_POOL_TIMEOUTS = Counter(
+    'foodgram_db_pool_timeouts_total',
+    'Запросы, не дождавшиеся соединения из пула.', ('alias',))
+
+# Считаются хуками воркеров в gunicorn.conf.py.
+WORKER_EXITS = Counter(
+    'foodgram_gunicorn_worker_exits_total', 'Завершённые воркеры gunicorn.')
+WORKER_TIMEOUTS = Counter(
+    'foodgram_gunicorn_worker_timeouts_total',
+    'Воркеры gunicorn, прерванные по timeout.')
+
+# Накопленные пулами значения на момент прошлой выгрузки в счётчики.
+pool_totals = {}
+pool_totals_lock = threading.Lock()
+
+
+def count_connection(sender, connection, **kwargs):
+    if getattr(connection, 'connection_reused', False):
+        return
+    DB_CONNECTIONS.labels(connection.alias, connection.vendor).inc()
+
+
+class QueryCounter:
+    """Обёртка для observe_queries(), считает запросы по базам."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.durations = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            alias = context['connection'].alias
+            self.durations[alias] += perf_counter() - started
+            self.counts[alias] += 1
+
+
+def observe_pools():
+    """Переносит состояние пулов foodgram.db в метрики процесса."""
+    for (alias, _), pool in list(pools.items()):
+        stats = pool.stats()
+        for state in ('in_use', 'idle', 'waiting'):
+            DB_POOL_CONNECTIONS.labels(alias, state).set(stats[state])
+        with pool_totals_lock:
+            seen = pool_totals.get(pool, (0, 0))
+            pool_totals[pool] = (stats['wait_seconds'], stats['timeouts'])
+        DB_POOL_WAIT_SECONDS.labels(alias).inc(stats['wait_seconds'] - seen[0])
+        DB_POOL_TIMEOUTS.labels(alias).inc(stats['timeouts'] - seen[1])
+
+
+def get_labels(request):
+    """
+    basename и действие из роутера api/urls.py. Для прочих адресов -
+    имя маршрута, чтобы число меток не зависело от путей запросов.
+    """
+    match = request.resolver_match
+    if match is None:
+        return '', 'unmatched'
+    initkwargs = getattr(match.func, 'initkwargs', {})
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if 'basename' in initkwargs and action:
+        return initkwargs['basename'], action
+    return '', match.view_name
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not settings.METRICS:
+        raise Http404
+    observe_pools()
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
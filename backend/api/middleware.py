@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+
+from api.instrumentation import (
+    RequestTimings, current_timings, observe_queries
+)
+from api.metrics import (
+    DB_QUERIES, DB_QUERY_SECONDS, REQUEST_ERRORS, REQUEST_LATENCY,
+    QueryCounter, count_connection, get_labels, observe_pools
+)
+
+logger = logging.getLogger('api.performance')
+
+
+class ObservingMiddleware:
+    """
+    Основа middleware, которые наблюдают за запросом целиком. Работает
+    и под WSGI, и под ASGI: в асинхронной цепочке не переключается в
+    поток, иначе все запросы процесса шли бы через один поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Так Django узнаёт асинхронные middleware, как в
+            # MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with self.observe(request) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with self.observe(request) as state:
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
+
+    def observe(self, request):
+        """Контекстный менеджер вокруг обработки запроса."""
+        raise NotImplementedError
+
+    def finish(self, request, response, state):
+        return response
+
+
+class PerformanceMiddleware(ObservingMiddleware):
+    """
+    Считает запросы к БД, время БД, сериализаторов и view, отдаёт их
+    в заголовке Server-Timing и пишет в лог медленные запросы.
+
+    Включается настройкой PERFORMANCE_INSTRUMENTATION, без неё
+    middleware не подключается вовсе.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.slow_request = settings.SLOW_REQUEST_MS / 1000
+
+    @contextmanager
+    def observe(self, request):
+        timings = request.timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = perf_counter()
+        try:
+            with observe_queries(timings.record_query):
+                yield timings
+        finally:
+            current_timings.reset(token)
+            timings.total = perf_counter() - started
+
+    def finish(self, request, response, timings):
+        if timings.action is None:
+            match = request.resolver_match
+            timings.action = match.view_name if match else None
+        response['Server-Timing'] = timings.server_timing()
+        if timings.total >= self.slow_request:
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                **timings.as_dict(),
+            }, ensure_ascii=False))
+        return response
+
+
+class MetricsMiddleware(ObservingMiddleware):
+    """Собирает метрики запросов для /metrics, если включена METRICS."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        connection_created.connect(count_connection)
+        super().__init__(get_response)
+
+    @contextmanager
+    def observe(self, request):
+        counter = QueryCounter()
+        with observe_queries(counter):
+            yield counter, perf_counter()
+
+    def finish(self, request, response, state):
+        counter, started = state
+        duration = perf_counter() - started
+        labels = get_labels(request)
+        REQUEST_LATENCY.labels(*labels, request.method).observe(duration)
+        if response.status_code >= 400:
+            REQUEST_ERRORS.labels(*labels, response.status_code).inc()
+        for alias, count in counter.counts.items():
+            DB_QUERIES.labels(*labels, alias).inc(count)
+            DB_QUERY_SECONDS.labels(*labels, alias).inc(
+                counter.durations[alias])
+        observe_pools()
+        return response
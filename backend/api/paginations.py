@@ -1,6 +1,264 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from collections import OrderedDict
+from hashlib import md5
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from recipes.versions import get_version
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который кэширует COUNT(*) по тексту запроса.
+
+    Для таблиц PostgreSQL без фильтров вместо подсчёта берётся оценка
+    планировщика, если таблица не меньше estimate_threshold строк.
+    count_is_exact ложно для оценки и для числа из кэша. Ключ числа
+    включает версии таблиц запроса (recipes.versions), поэтому после
+    записи в них COUNT(*) считается заново, а не берётся из кэша
+    на count_cache_timeout секунд вместе с закэшированным ответом.
+    """
+
+    count_cache_timeout = 30
+    estimate_threshold = 100000
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        if not queryset.query.where:
+            estimate = self.estimate_count(queryset)
+            if estimate is not None:
+                self.count_is_exact = False
+                return estimate
+        queryset = self.get_count_queryset(queryset)
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+        key = 'count:{}:{}:{}'.format(
+            queryset.db, md5(sql.encode()).hexdigest(),
+            ':'.join(map(str, self.get_versions(queryset))))
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_exact = False
+            return count
+        count = queryset.count()
+        cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    @staticmethod
+    def get_count_queryset(queryset):
+        """
+        queryset для COUNT(*) без сортировки и аннотаций, которые не
+        меняют число строк, например is_favorited: иначе СУБД вычисляет
+        их подзапросы для каждой строки.
+        """
+        queryset = queryset.order_by().values('pk')
+        queryset.query.annotations = {
+            alias: annotation
+            for alias, annotation in queryset.query.annotations.items()
+            if annotation.contains_aggregate
+        }
+        return queryset
+
+    @staticmethod
+    def get_versions(queryset):
+        """Версии таблиц, которые участвуют в запросе."""
+        tables = {
+            join.table_name for join in queryset.query.alias_map.values()}
+        return [
+            get_version(model)
+            for model in apps.get_models(include_auto_created=True)
+            if model._meta.db_table in tables
+        ]
+
+    def estimate_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < self.estimate_threshold:
+            return None
+        return int(row[0])
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class CachedCountPagination(CustomPagination):
+    """
+    Пагинация с кэшированным или приблизительным count.
+
+    Поле count_is_exact в ответе показывает, точен ли count.
+    """
+
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_exact', self.page.paginator.count_is_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {
+            'type': 'boolean',
+        }
+        return response_schema
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по сортировке модели с id для однозначности.
+
+    Позиция курсора - значения всех полей сортировки, у рецептов
+    (pub_date, id), и страница выбирается условием
+    pub_date < p OR (pub_date = p AND id < i), а не OFFSET.
+    CursorPagination хранит в позиции только первое поле и среди
+    равных значений переходит на OFFSET; здесь позиции уникальны,
+    поэтому глубокие страницы не дороже первой и COUNT(*) не нужен.
+    """
+
+    page_size = CustomPagination.page_size
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(
+            queryset.query.order_by or queryset.model._meta.ordering)
+        if ordering[0].startswith('-'):
+            return ordering + ('-id',)
+        return ordering + ('id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset, в котором позиция
+        # фильтруется по всем полям сортировки (filter_by_position).
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        if reverse:
+            queryset = queryset.order_by(*(
+                order[1:] if order.startswith('-') else f'-{order}'
+                for order in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = self.filter_by_position(queryset, current_position)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def filter_by_position(self, queryset, position):
+        """
+        Строки после position в направлении курсора: лексикографическое
+        сравнение по всем полям сортировки.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(
+                self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = {}
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            # (курсор назад) XOR (сортировка по убыванию) - как в DRF.
+            lookup = 'lt' if self.cursor.reverse != order.startswith(
+                '-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        try:
+            return queryset.filter(condition)
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(str(instance[field]))
+            else:
+                values.append(str(getattr(instance, field)))
+        return json.dumps(values, separators=(',', ':'))
+
+
+class FeedPagination(CachedCountPagination):
+    """
+    Постраничная пагинация с переключением на курсорную.
+
+    Курсорный режим включается параметром ?pagination=cursor, ссылки
+    next и previous в нём содержат непрозрачный курсор.
+    """
+
+    cursor_pagination_class = KeysetPagination
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_pagination_class.cursor_query_param
+                in request.query_params):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
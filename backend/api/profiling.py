@@ -0,0 +1,146 @@
+import cProfile
+import os
+import pstats
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'X-Profile'
+# return - вернуть отчёт вместо ответа, store - только сохранить файл.
+PROFILE_MODES = ('return', 'store')
+TOP_FUNCTIONS = 30
+
+
+def get_profile_mode(request):
+    """Режим профилирования, если его запросил сотрудник."""
+    mode = (request.query_params.get(PROFILE_PARAM)
+            or request.headers.get(PROFILE_HEADER))
+    if mode in PROFILE_MODES and request.user.is_staff:
+        return mode
+    return None
+
+
+class RequestProfile:
+    """Профиль cProfile и SQL-запросы одного запроса."""
+
+    def __init__(self, mode, name):
+        self.mode = mode
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.stack = None
+        self.duration = 0
+
+    def start(self):
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(
+                connection.execute_wrapper(self.record_query))
+        self.started = perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        if self.stack is None:
+            return
+        self.profiler.disable()
+        self.duration = perf_counter() - self.started
+        self.stack.close()
+        self.stack = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params),
+                'time_ms': round((perf_counter() - started) * 1000, 3),
+            })
+
+    def save(self):
+        """Сохраняет профиль в PROFILING_DIR для pstats и snakeviz."""
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        filename = '{}-{}-{}.prof'.format(
+            datetime.now().strftime('%Y%m%d-%H%M%S'), self.name,
+            uuid.uuid4().hex[:8])
+        self.profiler.dump_stats(
+            os.path.join(settings.PROFILING_DIR, filename))
+        return filename
+
+    def top_functions(self):
+        stats = pstats.Stats(self.profiler).sort_stats('cumulative')
+        functions = []
+        for func in stats.fcn_list[:TOP_FUNCTIONS]:
+            primitive_calls, calls, total, cumulative, _ = stats.stats[func]
+            functions.append({
+                'function': pstats.func_std_string(func),
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'tottime_ms': round(total * 1000, 3),
+                'cumtime_ms': round(cumulative * 1000, 3),
+            })
+        return functions
+
+    def report(self, response, filename):
+        return {
+            'status': response.status_code,
+            'file': filename,
+            'total_ms': round(self.duration * 1000, 3),
+            'queries': len(self.queries),
+            'db_ms': round(sum(query['time_ms'] for query in self.queries), 3),
+            'functions': self.top_functions(),
+            'sql': self.queries,
+        }
+
+
+class ProfiledViewMixin:
+    """
+    Выполняет запрос сотрудника под cProfile, если передан
+    ?profile=return|store или заголовок X-Profile.
+    """
+
+    profile = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        mode = get_profile_mode(request)
+        if mode:
+            self.profile = RequestProfile(
+                mode, '{}.{}'.format(
+                    type(self).__name__,
+                    self.action or request.method.lower()))
+            self.profile.start()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        profile, self.profile = self.profile, None
+        if profile is None:
+            return response
+        try:
+            if hasattr(response, 'render'):
+                response.render()
+        finally:
+            profile.stop()
+        filename = profile.save()
+        if profile.mode == 'store':
+            response[PROFILE_HEADER] = filename
+            return response
+        return JsonResponse(profile.report(response, filename))
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Необработанное исключение минует finalize_response.
+            if self.profile is not None:
+                self.profile.stop()
+                self.profile = None
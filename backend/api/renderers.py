@@ -0,0 +1,132 @@
+import csv
+import json
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SHOPPING_CART_RENDERERS = []
+
+SHOPPING_CART_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+
+# Числа, которые orjson пишет не так, как repr(float): с экспонентой
+# и меньше 1e-4. Похожий текст внутри строк тоже совпадёт, тогда ответ
+# просто отрисуется стандартным json. Шаблоны начинаются с литерала
+# и не объединены через |, иначе re проверяет каждую позицию и поиск
+# по большому ответу дольше самого orjson.dumps.
+ORJSON_FLOAT_MISMATCHES = (
+    re.compile(rb'e(?<=\de)[-+]?\d+(?=$|[,\]}])'),
+    re.compile(rb'0\.0000\d*(?=$|[,\]}])'),
+)
+
+
+def register_shopping_cart_renderer(renderer_class):
+    """Добавляет формат выгрузки списка покупок (?format=...)."""
+    SHOPPING_CART_RENDERERS.append(renderer_class)
+    return renderer_class
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Базовый класс формата выгрузки списка покупок.
+
+    Список отдаётся потоком через stream(), а render() нужен DRF
+    только для ответов с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, items):
+        """Отдаёт файл по частям из кортежей (название, единица, кол-во)."""
+        raise NotImplementedError
+
+
+@register_shopping_cart_renderer
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        yield 'Список покупок\n'
+        yield ' - '.join(SHOPPING_CART_HEADER) + '\n'
+        for item in items:
+            yield ' - '.join(map(str, item)) + '\n'
+
+
+class Echo:
+    """Файлоподобный объект, который возвращает записанное в него."""
+
+    def write(self, value):
+        return value
+
+
+@register_shopping_cart_renderer
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(SHOPPING_CART_HEADER)
+        for item in items:
+            yield writer.writerow(item)
+
+
+@register_shopping_cart_renderer
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, items):
+        yield '['
+        separator = ''
+        for name, measurement_unit, amount in items:
+            yield separator + json.dumps({
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен, с тем же результатом
+    байт в байт: даты, Decimal, ленивые строки и прочее, что orjson
+    пишет по-своему, передаются кодировщику DRF.
+
+    Отступы, ensure_ascii, неподдерживаемые orjson значения (например
+    целые больше 64 бит) и числа из ORJSON_FLOAT_MISMATCHES отрисовываются
+    стандартным json. Отличие одно: NaN и бесконечность orjson пишет
+    как null, а не падает с ValueError.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact
+                or self.ensure_ascii or self.get_indent(
+                    accepted_media_type, renderer_context or {})):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            content = None
+        if content is None or any(
+                pattern.search(content)
+                for pattern in ORJSON_FLOAT_MISMATCHES):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        # Как JSONRenderer: эти разделители строк ломают JavaScript.
+        return content.replace(
+            '\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029')
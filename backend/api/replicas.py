@@ -0,0 +1,91 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'replica-pin:{}'
+
+# Включается ReplicaReadMixin на время чтения из реплик.
+reading_replicas = ContextVar('reading_replicas', default=False)
+
+
+class ReplicaRouter:
+    """
+    Отправляет чтение на случайную реплику из DATABASE_REPLICAS, но
+    только внутри view с ReplicaReadMixin. Всё остальное, в том числе
+    аутентификация и любые записи, идёт в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and reading_replicas.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики вместе с данными.
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pin_to_primary(user):
+    """Пользователь читает из default REPLICA_PIN_SECONDS после записи."""
+    cache.set(PIN_KEY.format(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(PIN_KEY.format(user.pk))
+
+
+class ReplicaReadMixin:
+    """
+    Чтение (SAFE_METHODS) из реплик. В default остаются пользователи,
+    недавно писавшие сами, и ответы, данные которых менялись меньше
+    REPLICA_PIN_SECONDS назад по get_last_write(): иначе версии
+    recipes.versions связали бы с новыми ключами кэша и ETag ещё
+    не доехавшие до реплики данные.
+    """
+
+    def get_last_write(self):
+        """Время последней записи в данные ответа (unix timestamp)."""
+        return None
+
+    def use_replicas(self):
+        if not settings.DATABASE_REPLICAS:
+            return False
+        if self.request.method not in SAFE_METHODS:
+            return False
+        if is_pinned(self.request.user):
+            return False
+        last_write = self.get_last_write()
+        return (last_write is None
+                or last_write < time.time() - settings.REPLICA_PIN_SECONDS)
+
+    def initial(self, request, *args, **kwargs):
+        # Реплики включаются после аутентификации: только что
+        # выданный токен может ещё не доехать до них.
+        super().initial(request, *args, **kwargs)
+        if self.use_replicas():
+            self.replicas_token = reading_replicas.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.replicas_token = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.replicas_token is not None:
+                reading_replicas.reset(self.replicas_token)
+        if (settings.DATABASE_REPLICAS
+                and self.request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and self.request.user.is_authenticated):
+            pin_to_primary(self.request.user)
+        return response
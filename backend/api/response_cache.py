@@ -0,0 +1,47 @@
+import gzip
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+RESPONSE_KEY = 'response:{}'
+
+
+def accepts_gzip(request):
+    return (settings.RESPONSE_CACHE_GZIP
+            and 'gzip' in request.headers.get('Accept-Encoding', ''))
+
+
+def get_cached_response(key, use_gzip):
+    """Готовый ответ из кэша или None."""
+    cached = caches['responses'].get(RESPONSE_KEY.format(key))
+    if cached is None or use_gzip and cached['gzip'] is None:
+        return None
+    return make_response(cached, use_gzip)
+
+
+def cache_response(key, response, use_gzip):
+    """
+    Сохраняет отрисованное тело ответа и при RESPONSE_CACHE_GZIP его
+    сжатую копию. Возвращает ответ, который нужно отдать клиенту.
+    """
+    cached = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'gzip': (gzip.compress(response.content)
+                 if settings.RESPONSE_CACHE_GZIP else None),
+    }
+    caches['responses'].set(
+        RESPONSE_KEY.format(key), cached, settings.RESPONSE_CACHE_TIMEOUT)
+    return make_response(cached, use_gzip) if use_gzip else response
+
+
+def make_response(cached, use_gzip):
+    if use_gzip:
+        response = HttpResponse(
+            cached['gzip'], content_type=cached['content_type'])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(
+            cached['content'], content_type=cached['content_type'])
+    return response
@@ -1,14 +1,23 @@
+from collections import OrderedDict
+
 from django.db import transaction
+from django.db.models import Manager
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 
+from api.documents import get_documents
+from api.instrumentation import (
+    InstrumentedModelSerializer, InstrumentedSerializerMixin
+)
+from api.utils import get_recipes_limit
 from recipes.constants import MAX_AMOUNT, MIN_AMOUNT
 from recipes.models import (AmountIngredient, Favorite, Ingredient,
                             Recipe, ShoppingCart, Tag)
+from recipes.shopping_lists import get_recipe_amounts, recipe_amounts_changed
 from users.models import Subscription, User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedModelSerializer):
     """Serializer for User model."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
@@ -22,6 +31,9 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         return (
             request.user.is_authenticated
@@ -32,21 +44,22 @@ class UserSerializer(serializers.ModelSerializer):
 class SubscribeSerializer(UserSerializer):
     """Serializer for subscriptions."""
 
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
     recipes = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = list(UserSerializer.Meta.fields)
         fields.extend(['recipes', 'recipes_count'])
         read_only_fields = (
-            'email', 'username', 'first_name', 'last_name'
+            'email', 'username', 'first_name', 'last_name', 'recipes_count'
         )
 
     def get_recipes(self, obj):
-        queryset = obj.recipes.all()
-        recipes_limit = self.context['request'].GET.get('recipes_limit')
-        if recipes_limit and recipes_limit.isdigit():
-            queryset = queryset[:int(recipes_limit)]
+        queryset = getattr(obj, 'limited_recipes', None)
+        if queryset is None:
+            queryset = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context['request'])
+            if recipes_limit is not None:
+                queryset = queryset[:recipes_limit]
         recipes = RecipeShortSerializer(
             queryset, many=True,
             context=self.context
@@ -54,7 +67,7 @@ class SubscribeSerializer(UserSerializer):
         return recipes.data
 
 
-class SubscribeCreateSerializer(serializers.ModelSerializer):
+class SubscribeCreateSerializer(InstrumentedModelSerializer):
     """Serializer for subscription creating."""
 
     class Meta:
@@ -84,7 +97,7 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
             context=self.context).data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(InstrumentedModelSerializer):
     """Serializer for tags."""
 
     class Meta:
@@ -92,7 +105,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug', 'color')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(InstrumentedModelSerializer):
     """Serializer for ingredients."""
 
     class Meta:
@@ -100,7 +113,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class AmountIngredientSerializer(serializers.ModelSerializer):
+class AmountIngredientSerializer(InstrumentedModelSerializer):
     """Serializer for ingredients amount."""
 
     id = serializers.ReadOnlyField(
@@ -118,7 +131,7 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class CreateAmountIngredientSerializer(serializers.ModelSerializer):
+class CreateAmountIngredientSerializer(InstrumentedModelSerializer):
     """Serializer for ingredient amount creation."""
 
     id = serializers.PrimaryKeyRelatedField(
@@ -137,15 +150,54 @@ class CreateAmountIngredientSerializer(serializers.ModelSerializer):
         model = AmountIngredient
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Serializer for recipe reading."""
+class RecipeAuthorSerializer(UserSerializer):
+    """Автор рецепта без личной отметки о подписке."""
+
+    is_subscribed = None
+
+    class Meta(UserSerializer.Meta):
+        fields = ('id', 'email', 'username', 'first_name', 'last_name')
+
+
+class RecipeDocumentSerializer(InstrumentedModelSerializer):
+    """Общая для всех пользователей часть рецепта (api.documents)."""
 
     image = Base64ImageField()
-    author = UserSerializer(read_only=True)
+    author = RecipeAuthorSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = AmountIngredientSerializer(
         many=True,
         source='recipe_ingredient')
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'name',
+            'text', 'cooking_time', 'image',
+            'tags', 'author', 'ingredients',
+            'favorites_count', 'in_carts_count')
+
+
+class RecipeListSerializer(InstrumentedSerializerMixin,
+                           serializers.ListSerializer):
+    """Берёт документы всех рецептов страницы разом."""
+
+    def to_representation(self, data):
+        return self._timed(self.represent, data)
+
+    def represent(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        documents = get_documents(recipes, RecipeDocumentSerializer)
+        return [
+            self.child.add_personal_fields(recipe, document)
+            for recipe, document in zip(recipes, documents)
+        ]
+
+
+class RecipeReadSerializer(RecipeDocumentSerializer):
+    """Serializer for recipe reading."""
+
+    author = UserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -155,10 +207,40 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'id', 'name',
             'text', 'cooking_time', 'image',
             'tags', 'author', 'ingredients',
-            'is_favorited', 'is_in_shopping_cart')
+            'is_favorited', 'is_in_shopping_cart',
+            'favorites_count', 'in_carts_count')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self._timed(self.represent, instance)
+
+    def represent(self, instance):
+        document, = get_documents([instance], RecipeDocumentSerializer)
+        return self.add_personal_fields(instance, document)
+
+    def add_personal_fields(self, instance, document):
+        """Дополняет документ рецепта отметками текущего пользователя."""
+        is_subscribed = getattr(instance, 'author_is_subscribed', None)
+        if is_subscribed is None:
+            is_subscribed = self.fields['author'].get_is_subscribed(
+                instance.author)
+        values = {
+            **document,
+            'author': {**document['author'], 'is_subscribed': is_subscribed},
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+        }
+        request = self.context.get('request')
+        if request is not None and values['image']:
+            values['image'] = request.build_absolute_uri(values['image'])
+        return OrderedDict(
+            (field, values[field]) for field in self.Meta.fields)
 
     def get_is_favorited(self, obj):
         """Проверка на нахождение рецепта в списке избранного."""
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         request = self.context.get('request')
         is_favorited = (
             request.user.is_authenticated and getattr(
@@ -169,6 +251,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка на нахождение рецепта в списке покупок."""
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         request = self.context.get('request')
         is_in_shopping_cart = (
             request.user.is_authenticated and getattr(
@@ -178,7 +263,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return is_in_shopping_cart
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(InstrumentedModelSerializer):
     """Serializer for recipe creation."""
 
     image = Base64ImageField()
@@ -265,16 +350,18 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         instance.tags.clear()
         instance.tags.set(validated_data.pop('tags'))
+        old_amounts = get_recipe_amounts(instance.id)
         instance.ingredients.clear()
         ingredients = validated_data.pop('ingredients')
         self.create_ingredients(instance, ingredients)
+        recipe_amounts_changed(instance.id, old_amounts)
         return super().update(instance, validated_data)
 
     def to_representation(self, recipe):
         return RecipeReadSerializer(recipe, context=self.context).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(InstrumentedModelSerializer):
     """Serializer for recipe short view."""
 
     image = Base64ImageField()
@@ -284,7 +371,7 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'cooking_time', 'image')
 
 
-class UserRecipeRelationSerializer(serializers.ModelSerializer):
+class UserRecipeRelationSerializer(InstrumentedModelSerializer):
     """Common serializer for favorites and shopping list."""
 
     class Meta:
@@ -0,0 +1,28 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_tokens
+from api.instrumentation import call_query_wrappers
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    # В кэше лежит копия пользователя: смена пароля, деактивация и
+    # правка профиля должны сбросить её. Вход меняет только last_login.
+    if not created and update_fields != frozenset(('last_login',)):
+        invalidate_tokens(Token.objects.filter(
+            user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(connection_created)
+def add_query_wrappers(sender, connection, **kwargs):
+    if call_query_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.append(call_query_wrappers)
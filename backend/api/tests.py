@@ -0,0 +1,480 @@
+import os
+import tempfile
+import warnings
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from api.authentication import (
+    REVOKED, CachedTokenAuthentication, _token_key, local_tokens
+)
+from recipes.counters import recount
+from recipes.models import (
+    AmountIngredient, Favorite, Ingredient,
+    Recipe, ShoppingCart, ShoppingListItem, Tag
+)
+from recipes.shopping_lists import find_mismatches, rebuild_shopping_lists
+from users.models import Subscription, User
+
+USERS = 12
+RECIPES = 40
+INGREDIENTS_PER_RECIPE = 5
+PAGE_SIZES = (6, 30)
+
+# Маршрут -> (url, число запросов к БД на холодных кэшах).
+# Для постраничных маршрутов число проверяется на каждом размере
+# страницы из PAGE_SIZES и не должно зависеть от него.
+BUDGETS = {
+    'recipes-list': ('/api/recipes/?limit={limit}', 4),
+    'recipes-list-filtered': (
+        '/api/recipes/?limit={limit}&tags=tag0&is_favorited=1', 5),
+    'recipes-list-cursor': (
+        '/api/recipes/?limit={limit}&pagination=cursor', 3),
+    'recipes-detail': ('/api/recipes/{recipe}/', 3),
+    'users-list': ('/api/users/?limit={limit}', 2),
+    'users-detail': ('/api/users/{author}/', 1),
+    'users-me': ('/api/users/me/', 1),
+    'users-subscriptions': (
+        '/api/users/subscriptions/?limit={limit}&recipes_limit=3', 3),
+    'users-subscriptions-cursor': (
+        '/api/users/subscriptions/?limit={limit}&pagination=cursor', 2),
+    'users-subscriptions-unlimited': (
+        '/api/users/subscriptions/?limit={limit}', 3),
+    'tags-list': ('/api/tags/', 1),
+    'tags-detail': ('/api/tags/{tag}/', 1),
+    'ingredients-list': ('/api/ingredients/?name=ing', 1),
+    'ingredients-detail': ('/api/ingredients/{ingredient}/', 1),
+    'recipes-download-shopping-cart': (
+        '/api/recipes/download_shopping_cart/', 1),
+}
+
+# Маршруты, доступные без авторизации, и их число запросов.
+ANONYMOUS_BUDGETS = {
+    'recipes-list': ('/api/recipes/?limit={limit}', 4),
+    'recipes-list-filtered': ('/api/recipes/?limit={limit}&tags=tag0', 5),
+    'recipes-list-cursor': (
+        '/api/recipes/?limit={limit}&pagination=cursor', 3),
+    'recipes-detail': ('/api/recipes/{recipe}/', 3),
+    'users-list': ('/api/users/?limit={limit}', 2),
+    'users-detail': ('/api/users/{author}/', 1),
+    'tags-list': ('/api/tags/', 1),
+    'tags-detail': ('/api/tags/{tag}/', 1),
+    'ingredients-list': ('/api/ingredients/?name=ing', 1),
+    'ingredients-detail': ('/api/ingredients/{ingredient}/', 1),
+}
+
+# Списки без фильтров, для которых на PostgreSQL перед COUNT(*)
+# запрашивается оценка планировщика (api.paginations).
+ESTIMATED_ROUTES = {'recipes-list', 'users-list'}
+
+
+class IsolatedCacheTestCase(TestCase):
+    """
+    TestCase с кэшами в своём временном каталоге. Кэш default файловый
+    и общий для процессов машины, поэтому без этого очистка кэша
+    в тестах сбрасывала бы версии, токены и привязки сервера разработки.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cache_dir = tempfile.TemporaryDirectory(prefix='foodgram_test_')
+        cls.addClassCleanup(cache_dir.cleanup)
+        cache_override = override_settings(CACHES={
+            alias: {**config, 'LOCATION': os.path.join(cache_dir.name, alias)}
+            for alias, config in settings.CACHES.items()
+        })
+        cache_override.enable()
+        cls.addClassCleanup(cache_override.disable)
+        super().setUpClass()
+
+    @staticmethod
+    def clear_caches():
+        for cache in caches.all():
+            cache.clear()
+
+
+class QueryBudgetTests(IsolatedCacheTestCase):
+    """
+    Число SQL-запросов каждого маршрута API на заполненной базе.
+
+    Перед каждым запросом очищаются все кэши: версии таблиц, count
+    страниц, документы рецептов и готовые ответы. Индекс ингредиентов
+    перестраивается, потому что версия Ingredient меняется вместе
+    с кэшем. Так проверяется холодный путь, и число запросов
+    не зависит от предыдущих запросов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Первичные ключи нужны связям ниже, а bulk_create возвращает их
+        # не на всех СУБД, поэтому основные объекты создаются по одному.
+        users = [
+            User.objects.create(
+                username=f'user{i}', email=f'user{i}@foodgram.ru',
+                first_name='Имя', last_name='Фамилия')
+            for i in range(USERS)
+        ]
+        tags = [
+            Tag.objects.create(name=f'tag{i}', slug=f'tag{i}',
+                               color=f'#00000{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'ing{i}', measurement_unit='г')
+            for i in range(RECIPES + INGREDIENTS_PER_RECIPE)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                name=f'recipe{i}', author=users[i % (USERS - 1)],
+                text='Текст', cooking_time=10, image='recipes/seed.png')
+            for i in range(RECIPES)
+        ]
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for i, recipe in enumerate(recipes)
+            for tag in tags[:i % len(tags) + 1]
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredient=ingredients[i + j],
+                             amount=j + 1)
+            for i, recipe in enumerate(recipes)
+            for j in range(INGREDIENTS_PER_RECIPE)
+        )
+        cls.user = users[-1]
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in recipes[::3])
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.user, author=author)
+            for author in users[:-1])
+        rebuild_shopping_lists()
+        recount()
+        cls.context = {
+            'recipe': recipes[0].id,
+            'author': users[0].id,
+            'tag': tags[0].id,
+            'ingredient': ingredients[0].id,
+        }
+
+    def assert_budgets(self, client, budgets):
+        for route, (url, queries) in budgets.items():
+            if (route in ESTIMATED_ROUTES
+                    and connection.vendor == 'postgresql'):
+                queries += 1
+            sizes = PAGE_SIZES if '{limit}' in url else (None,)
+            for limit in sizes:
+                path = url.format(limit=limit, **self.context)
+                with self.subTest(route=route, path=path):
+                    self.clear_caches()
+                    with self.assertNumQueries(queries):
+                        response = client.get(path)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_budgets(client, BUDGETS)
+
+    def test_anonymous(self):
+        self.assert_budgets(APIClient(), ANONYMOUS_BUDGETS)
+
+
+class KeysetPaginationTests(IsolatedCacheTestCase):
+    """Курсор проходит рецепты с одинаковой pub_date без OFFSET."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия')
+        Recipe.objects.bulk_create(
+            Recipe(name=f'recipe{i}', author=author, text='Текст',
+                   cooking_time=10, image='recipes/seed.png')
+            for i in range(7)
+        )
+        # Три группы рецептов с одинаковым временем публикации.
+        now = timezone.now()
+        for i, recipe in enumerate(Recipe.objects.order_by('id')):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timezone.timedelta(minutes=i // 3))
+        cls.expected = list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True))
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any(
+                'OFFSET' in query['sql'] for query in queries))
+            data = response.json()
+            page = [recipe['id'] for recipe in data['results']]
+            ids = ids + page if link == 'next' else page + ids
+            url = data[link]
+        return ids
+
+    def test_forward_and_back(self):
+        self.clear_caches()
+        self.assertEqual(
+            self.walk('/api/recipes/?limit=2&pagination=cursor', 'next'),
+            self.expected)
+        last = self.client.get(
+            '/api/recipes/?limit=2&pagination=cursor').json()
+        while last['next']:
+            last = self.client.get(last['next']).json()
+        self.assertEqual(
+            self.walk(last['previous'], 'previous')
+            + [recipe['id'] for recipe in last['results']],
+            self.expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=cD1hYmM%3D')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeCacheTests(IsolatedCacheTestCase):
+    """Ответы о рецептах из кэшей меняются вместе с данными."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия')
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                name='recipe', author=self.author, text='Текст',
+                cooking_time=10, image='recipes/seed.png')
+
+    def test_count_after_create(self):
+        self.clear_caches()
+        self.create_recipe()
+        for count in (1, 2):
+            with self.subTest(count=count):
+                response = self.client.get('/api/recipes/')
+                self.assertEqual(response.json()['count'], count)
+                self.create_recipe()
+
+    def test_invalid_pk(self):
+        self.clear_caches()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for pk in ('a%20b', 'abc'):
+                with self.subTest(pk=pk):
+                    response = self.client.get(f'/api/recipes/{pk}/')
+                    self.assertEqual(response.status_code, 404)
+
+
+class TokenCacheTests(IsolatedCacheTestCase):
+    """Кэш токенов не переживает отзыв и не хранит хэш пароля."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@foodgram.ru', password='secret',
+            first_name='Имя', last_name='Фамилия')
+
+    def setUp(self):
+        self.clear_caches()
+        self.token = Token.objects.create(user=self.user)
+        self.key = self.token.key
+        self.cache_key = _token_key(self.key)
+        local_tokens.delete(self.cache_key)
+        self.addCleanup(local_tokens.delete, self.cache_key)
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(
+            self.key)
+
+    def test_revoked_while_loading(self):
+        load = TokenAuthentication.authenticate_credentials
+
+        def load_and_revoke(auth, key):
+            # Выход пользователя между чтением токена и записью в кэш.
+            result = load(auth, key)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.token.delete()
+            return result
+
+        with mock.patch.object(
+                TokenAuthentication, 'authenticate_credentials',
+                load_and_revoke):
+            self.authenticate()
+        self.assertEqual(caches['default'].get(self.cache_key), REVOKED)
+        self.assertIsNone(local_tokens.get(self.cache_key))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_not_cached(self):
+        self.authenticate()
+        for token in (caches['default'].get(self.cache_key),
+                      local_tokens.get(self.cache_key)):
+            self.assertNotIn('password', token.user.__dict__)
+            self.assertTrue(token.user.check_password('secret'))
+        user, _ = self.authenticate()
+        self.assertTrue(user.check_password('secret'))
+
+
+class ShoppingListTests(IsolatedCacheTestCase):
+    """Списки покупок совпадают с корзинами после каждого изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.buyer, cls.other = (
+            User.objects.create(
+                username=name, email=f'{name}@foodgram.ru',
+                first_name='Имя', last_name='Фамилия')
+            for name in ('author', 'buyer', 'other')
+        )
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@foodgram.ru', password='admin',
+            first_name='Имя', last_name='Фамилия')
+        cls.tag = Tag.objects.create(
+            name='tag', slug='tag', color='#000000')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ing{i}', measurement_unit='г')
+            for i in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                name=f'recipe{i}', author=cls.author, text='Текст',
+                cooking_time=10, image='recipes/seed.png')
+            for i in range(2)
+        ]
+        for recipe in cls.recipes:
+            recipe.tags.add(cls.tag)
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=10 * (i + 1) + j)
+            for i, recipe in enumerate(cls.recipes)
+            for j, ingredient in enumerate(cls.ingredients[i:i + 2])
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+        for recipe in self.recipes:
+            ShoppingCart.objects.create(user=self.buyer, recipe=recipe)
+
+    def assert_consistent(self):
+        self.assertEqual(find_mismatches(), {})
+        self.assertTrue(ShoppingListItem.objects.exists())
+
+    def test_add_and_remove(self):
+        self.api.force_authenticate(self.other)
+        url = f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        self.assertEqual(self.api.post(url).status_code, 201)
+        self.assert_consistent()
+        self.assertEqual(self.api.delete(url).status_code, 204)
+        self.assert_consistent()
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.other).exists())
+
+    def test_recipe_edit(self):
+        self.api.force_authenticate(self.author)
+        response = self.api.patch(
+            f'/api/recipes/{self.recipes[0].id}/', {
+                'name': 'recipe0', 'text': 'Текст', 'cooking_time': 10,
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': self.ingredients[1].id, 'amount': 7},
+                    {'id': self.ingredients[2].id, 'amount': 5},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_consistent()
+
+    def test_admin_amount_edit(self):
+        row = AmountIngredient.objects.filter(
+            recipe=self.recipes[0]).first()
+        response = self.admin_client.post(
+            f'/admin/recipes/amountingredient/{row.id}/change/', {
+                'recipe': self.recipes[1].id,
+                'ingredient': self.ingredients[0].id,
+                'amount': row.amount + 100,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+
+    def test_admin_cart_reassign(self):
+        cart = ShoppingCart.objects.filter(
+            user=self.buyer, recipe=self.recipes[0]).get()
+        response = self.admin_client.post(
+            f'/admin/recipes/shoppingcart/{cart.id}/change/', {
+                'user': self.other.id, 'recipe': self.recipes[0].id,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        self.assertTrue(
+            ShoppingListItem.objects.filter(user=self.other).exists())
+
+
+class CounterTests(IsolatedCacheTestCase):
+    """Счётчики рецептов совпадают с пересчётом после каждого изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user = (
+            User.objects.create(
+                username=name, email=f'{name}@foodgram.ru',
+                first_name='Имя', last_name='Фамилия')
+            for name in ('author', 'user')
+        )
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@foodgram.ru', password='admin',
+            first_name='Имя', last_name='Фамилия')
+        cls.recipes = [
+            Recipe.objects.create(
+                name=f'recipe{i}', author=cls.author, text='Текст',
+                cooking_time=10, image='recipes/seed.png')
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def counters(self):
+        return list(Recipe.objects.order_by('id').values_list(
+            'id', 'favorites_count', 'in_carts_count'))
+
+    def assert_consistent(self):
+        stored = self.counters()
+        recount()
+        self.assertEqual(stored, self.counters())
+
+    def test_admin_reassign(self):
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                relation = model.objects.create(
+                    user=self.user, recipe=self.recipes[0])
+                self.assert_consistent()
+                response = self.admin_client.post(
+                    f'/admin/recipes/{model._meta.model_name}/'
+                    f'{relation.id}/change/',
+                    {'user': self.user.id, 'recipe': self.recipes[1].id})
+                self.assertEqual(response.status_code, 302)
+                self.assert_consistent()
+                field = {Favorite: 'favorites_count',
+                         ShoppingCart: 'in_carts_count'}[model]
+                self.assertEqual(
+                    [getattr(recipe, field) for recipe in
+                     Recipe.objects.order_by('id')], [0, 1])
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_read_view
 from api.views import (
     IngredientViewSet, RecipeViewSet,
     TagViewSet, UserViewSet
@@ -16,6 +18,19 @@ v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('tags', TagViewSet, basename='tags')
 v1_router.register('users', UserViewSet, basename='users')
 
+# Самые нагруженные чтения, которые под ASGI идут через пул потоков.
+ASYNC_READ_ROUTES = {
+    'recipes-list', 'recipes-detail',
+    'ingredients-list', 'ingredients-detail',
+    'tags-list', 'tags-detail',
+    'users-subscriptions',
+}
+
+if settings.ASYNC_VIEWS:
+    for pattern in v1_router.urls:
+        if pattern.name in ASYNC_READ_ROUTES:
+            pattern.callback = async_read_view(pattern.callback)
+
 urlpatterns = [
     path('', include(v1_router.urls)),
     path('', include('djoser.urls')),
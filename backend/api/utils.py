@@ -1,26 +1,38 @@
-from io import StringIO
+from collections import defaultdict
 
-from django.http import HttpResponse
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
+from recipes.models import Recipe
 
-def generate_shopping_cart(shopping_cart):
-    text_stream = StringIO()
-    text_stream.write('Список покупок\n')
-    text_stream.write('Ингредиент - Единица измерения - Количество\n')
-    lines = (' - '.join(map(str, item)) + '\n' for item in shopping_cart)
-    text_stream.writelines(lines)
-    response = HttpResponse(
-        text_stream.getvalue(),
-        content_type='text/plain')
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+
+
+def generate_shopping_cart(shopping_cart, renderer):
+    """
+    Отдаёт список покупок потоком в формате renderer.
+
+    Заголовок уходит клиенту до выполнения запроса, строки читаются
+    серверным курсором, поэтому память не зависит от размера списка.
+    """
+    response = StreamingHttpResponse(
+        renderer.stream(
+            shopping_cart.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)),
+        content_type=f'{renderer.media_type}; charset={renderer.charset}'
+    )
     response['Content-Disposition'] = (
-        "attachment;filename='shopping_cart.txt'"
+        f'attachment; filename="shopping_cart.{renderer.format}"'
     )
     return response
 
 
+@transaction.atomic
 def delete_model_by_recipe(request, pk, model):
     deleting_model = get_object_or_404(model.objects.filter(
         user=request.user, recipe_id=pk))
@@ -28,6 +40,7 @@ def delete_model_by_recipe(request, pk, model):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@transaction.atomic
 def create_serializer_by_recipe(serializer, request, pk):
     create_serializer = serializer(
         data={'user': request.user.id, 'recipe': pk},
@@ -37,3 +50,39 @@ def create_serializer_by_recipe(serializer, request, pk):
     return Response(
         create_serializer.data, status=status.HTTP_201_CREATED
     )
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.GET.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+def get_limited_recipes(authors, recipes_limit=None):
+    """
+    Возвращает рецепты авторов одним запросом, не более recipes_limit
+    на каждого автора, сгруппированные по id автора.
+    """
+    recipes = Recipe.objects.filter(author__in=authors)
+    if recipes_limit is not None and connection.features.supports_over_clause:
+        ranked = recipes.order_by().annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc(),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            'SELECT * FROM ({}) ranked WHERE ranked.recipe_rank <= %s '
+            'ORDER BY ranked.recipe_rank'.format(sql),
+            (*params, recipes_limit)
+        )
+    elif recipes_limit is not None:
+        recipes = recipes.filter(id__in=Subquery(
+            Recipe.objects.filter(author=OuterRef('author'))
+            .values('id')[:recipes_limit]
+        ))
+    recipes_by_author = defaultdict(list)
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
@@ -1,17 +1,23 @@
-from django.db.models import Sum
+from django.db.models import Exists, OuterRef, Value
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import (
     SAFE_METHODS, IsAuthenticated, IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.paginations import CustomPagination
+from api.conditional import ConditionalGetMixin
+from api.filters import RecipeFilter
+from api.indexes import ingredient_index
+from api.instrumentation import InstrumentedViewMixin
+from api.paginations import FeedPagination
 from api.permissions import AuthorOrReadOnly
+from api.replicas import ReplicaReadMixin
+from api.renderers import SHOPPING_CART_RENDERERS
 from api.serializers import (
     FavoriteCreateDeleteSerializer, IngredientSerializer,
     RecipeCreateSerializer, RecipeReadSerializer,
@@ -20,20 +26,30 @@ from api.serializers import (
 )
 from api.utils import (
     generate_shopping_cart, delete_model_by_recipe,
-    create_serializer_by_recipe
+    create_serializer_by_recipe, get_limited_recipes, get_recipes_limit
 )
 from recipes.models import (
-    AmountIngredient, Favorite, Ingredient,
-    Recipe, ShoppingCart, Tag
+    Favorite, Ingredient, Recipe,
+    ShoppingCart, ShoppingListItem, Tag
 )
+from recipes.versions import get_last_modified, get_version
 from users.models import Subscription, User
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(InstrumentedViewMixin, ReplicaReadMixin, UserViewSet):
     """ViewSet модели User"""
     queryset = User.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = CustomPagination
+    pagination_class = FeedPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('pk'))))
+        return queryset
 
     def get_permissions(self):
         if self.action == ['me', 'subscribe', 'delete_subscribe',
@@ -66,40 +82,141 @@ class UserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         subscriptions = User.objects.filter(
-            author__user=request.user)
+            author__user=request.user
+        ).annotate(is_subscribed=Value(True))
         page = self.paginate_queryset(subscriptions)
+        recipes_by_author = get_limited_recipes(
+            page, get_recipes_limit(request))
+        for author in page:
+            author.limited_recipes = recipes_by_author[author.id]
         serializer = SubscribeSerializer(
             page, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(InstrumentedViewMixin, ConditionalGetMixin,
+                        ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet модели Ingredient."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = IngredientFilter
     pagination_class = None
+    version_models = (Ingredient,)
+    cache_responses = True
 
+    def list(self, request, *args, **kwargs):
+        # Поиск по ?name= выполняет индекс в памяти, а не фильтр по БД.
+        return self.conditional_response(
+            *self.get_validators(),
+            lambda: Response(ingredient_index.search(
+                request.query_params.get('name', ''))))
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(InstrumentedViewMixin, ConditionalGetMixin,
+                 ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet модели Tag."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    version_models = (Tag,)
+    cache_responses = True
+
+
+# Поля рецепта, от которых зависит ETag его страницы.
+RECIPE_VALIDATOR_FIELDS = (
+    'updated_at', 'favorites_count', 'in_carts_count',
+    'is_favorited', 'is_in_shopping_cart', 'author_is_subscribed',
+)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(InstrumentedViewMixin, ConditionalGetMixin,
+                    ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet модели Recipe."""
 
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'ingredients')
+    queryset = Recipe.objects.select_related('author')
     permission_classes = (AuthorOrReadOnly, IsAuthenticatedOrReadOnly)
-    pagination_class = CustomPagination
+    pagination_class = FeedPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    vary_headers = ('Authorization',)
+
+    def get_queryset(self):
+        # Теги и ингредиенты приходят из документов рецептов
+        # (api.documents) и загружаются только для пересборки.
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated and self.request.method in SAFE_METHODS:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                author_is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('author'))),
+            )
+        return queryset
+
+    def is_cacheable(self):
+        # Ответы пользователям содержат их личные отметки.
+        return not self.request.user.is_authenticated
+
+    def get_version_models(self):
+        # Страница одного рецепта зависит от его строки, а не от всей
+        # таблицы рецептов.
+        models = [Tag, Ingredient, User]
+        if self.action == 'list':
+            models.append(Recipe)
+        if self.request.user.is_authenticated:
+            models.append(Subscription)
+        return models
+
+    def get_recipe_pk(self):
+        # pk из URL входит в ключи кэша: строка с пробелами недопустима
+        # для memcached, а любая другая оставила бы вечный ключ версии.
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise NotFound
+
+    def get_last_write(self):
+        last_write = super().get_last_write()
+        if self.action == 'retrieve':
+            last_write = max(
+                last_write, get_last_modified(Recipe, self.get_recipe_pk()))
+        return last_write
+
+    def get_validators(self, instance=None):
+        """
+        Для пользователя валидатор страницы рецепта берётся из его
+        строки вместе с личными отметками, для анонима - из версии
+        рецепта, без запросов к БД.
+        """
+        parts, last_modified = super().get_validators()
+        parts.append(self.request.user.id)
+        if instance is not None:
+            parts.extend(
+                getattr(instance, field, None)
+                for field in RECIPE_VALIDATOR_FIELDS)
+            last_modified = max(
+                last_modified, int(instance.updated_at.timestamp()))
+        elif self.action == 'retrieve':
+            pk = self.get_recipe_pk()
+            parts.append(get_version(Recipe, pk))
+            last_modified = max(last_modified, get_last_modified(Recipe, pk))
+        return parts, last_modified
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = None
+        if request.user.is_authenticated:
+            instance = self.get_object()
+
+        def get_response():
+            return Response(
+                self.get_serializer(instance or self.get_object()).data)
+
+        return self.conditional_response(
+            *self.get_validators(instance), get_response)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -141,14 +258,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         methods=['get'],
         detail=False,
-        permission_classes=[permissions.IsAuthenticated]
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=SHOPPING_CART_RENDERERS
     )
     def download_shopping_cart(self, request):
+        """Скачать список покупок в формате ?format=txt|csv|json."""
         return generate_shopping_cart(
-            AmountIngredient.objects.select_related('recipe', 'ingredient')
-            .filter(recipe__recipes_shoppingcart_related__user=request.user)
+            ShoppingListItem.objects
+            .filter(user=request.user)
             .values_list(
                 'ingredient__name',
-                'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
-            .order_by('ingredient__name'))
+                'ingredient__measurement_unit',
+                'total_amount')
+            .order_by('ingredient__name'),
+            request.accepted_renderer)
@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Асинхронные чтения api.async_views имеют смысл только под ASGI.
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
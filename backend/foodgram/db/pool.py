@@ -0,0 +1,202 @@
+import threading
+from time import monotonic
+
+from django.db.utils import OperationalError
+
+# Пулы процесса по псевдонимам и именам БД.
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса, общий для его потоков.
+
+    Держит до size простаивающих соединений и открывает ещё до overflow
+    сверх них под пиковую нагрузку; лишние закрываются при возврате.
+    Если все size + overflow заняты, запрос ждёт свободное соединение
+    до timeout секунд, затем получает OperationalError.
+    """
+
+    def __init__(self, connect, size, overflow, timeout, check=None):
+        self.connect = connect
+        self.check = check
+        self.size = size
+        self.overflow = overflow
+        self.timeout = timeout
+        self.idle = []
+        self.opened = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self.wait_seconds = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Соединение и признак того, что оно взято из простаивающих."""
+        while True:
+            connection = self._checkout()
+            if connection is None:
+                break
+            if self.check is None or self.check(connection):
+                return connection, True
+            self.release(connection, discard=True)
+        try:
+            return self.connect(), False
+        except BaseException:
+            self._forget()
+            raise
+
+    def _checkout(self):
+        """Свободное соединение или None, если можно открыть новое."""
+        started = monotonic()
+        deadline = started + self.timeout
+        with self.condition:
+            limit = self.size + self.overflow
+            try:
+                while not self.idle and self.opened >= limit:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise OperationalError(
+                            f'Нет свободных соединений в пуле за '
+                            f'{self.timeout} с.')
+                    self.waiting += 1
+                    try:
+                        self.condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+            finally:
+                self.wait_seconds += monotonic() - started
+            self.in_use += 1
+            if self.idle:
+                return self.idle.pop()
+            self.opened += 1
+            return None
+
+    def _forget(self):
+        with self.condition:
+            self.in_use -= 1
+            self.opened -= 1
+            self.condition.notify()
+
+    def release(self, connection, discard=False):
+        """Возвращает соединение в пул или закрывает его."""
+        with self.condition:
+            self.in_use -= 1
+            keep = not discard and len(self.idle) < self.size
+            if keep:
+                self.idle.append(connection)
+            else:
+                self.opened -= 1
+            self.condition.notify()
+        if not keep:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'overflow': self.overflow,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                'timeouts': self.timeouts,
+                'wait_seconds': self.wait_seconds,
+            }
+
+
+class DatabaseWrapperMixin:
+    """
+    Проверка постоянных соединений и пул для бэкендов foodgram.db.
+
+    CONN_HEALTH_CHECKS: соединение, пережившее запрос (CONN_MAX_AGE),
+    проверяется при первом обращении в следующем запросе, и вместо
+    разорванного сервером открывается новое.
+
+    POOL: {'SIZE': ..., 'OVERFLOW': ..., 'TIMEOUT': ...} включает пул
+    процесса. Соединение берётся из него при первом запросе к БД и
+    возвращается в конце запроса, поэтому CONN_MAX_AGE должен быть 0.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = True
+        # Соединение получено из пула, а не открыто заново.
+        self.connection_reused = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        # Имя БД входит в ключ: тесты подменяют его на тестовую.
+        key = (self.alias, self.settings_dict['NAME'])
+        pool = pools.get(key)
+        if pool is None:
+            check = None
+            if self.settings_dict.get('CONN_HEALTH_CHECKS'):
+                check = self.is_connection_usable
+            with pools_lock:
+                pool = pools.get(key)
+                if pool is None:
+                    pool = pools[key] = ConnectionPool(
+                        self.connect_to_database,
+                        options.get('SIZE', 10),
+                        options.get('OVERFLOW', 10),
+                        options.get('TIMEOUT', 30),
+                        check=check)
+        return pool
+
+    def connect_to_database(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def is_connection_usable(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection, self.connection_reused = pool.acquire()
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Соединение из прерванной транзакции или с ошибками не
+        # возвращается в пул.
+        discard = self.errors_occurred or self.in_atomic_block
+        if not discard:
+            try:
+                self.connection.rollback()
+            except self.Database.Error:
+                discard = True
+        pool.release(self.connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        # Флаг сбрасывается после родительского метода: тот сам вызывает
+        # ensure_connection(), а проверять соединение нужно при первом
+        # запросе к БД.
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None:
+            self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                    and not self.is_usable()):
+                self.close()
+        super().ensure_connection()
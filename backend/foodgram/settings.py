@@ -1,6 +1,8 @@
 import os
+import tempfile
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management.utils import get_random_secret_key
 from dotenv import load_dotenv
 
@@ -32,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,17 +65,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Асинхронные view для самых нагруженных чтений (api.async_views).
+# foodgram/asgi.py включает их сам; под WSGI они только мешают.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False').lower() == 'true'
+
 if os.getenv('DATABASES') == 'sqlite':
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'foodgram.db.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
 else:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'foodgram.db.postgresql',
             'NAME': os.getenv('DB_NAME', default='postgres'),
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
@@ -80,6 +90,110 @@ else:
         }
     }
 
+# Соединения с БД (foodgram.db): постоянные на DB_CONN_MAX_AGE секунд
+# с проверкой перед первым запросом к БД в каждом запросе к API или,
+# при DB_POOL=True, из пула процесса для потоковых и асинхронных
+# воркеров. Соединения пула возвращаются в него в конце запроса.
+DB_POOL = os.getenv('DB_POOL', default='False').lower() == 'true'
+
+DATABASES['default'].update({
+    'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+    'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', default='True').lower() == 'true',
+    'POOL': {
+        'SIZE': int(os.getenv('DB_POOL_SIZE', default=10)),
+        'OVERFLOW': int(os.getenv('DB_POOL_OVERFLOW', default=10)),
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=30)),
+    } if DB_POOL else None,
+})
+
+# Реплики только для чтения (api.replicas), через запятую: файлы SQLite
+# относительно BASE_DIR или хосты PostgreSQL вида host[:port]. Схему и
+# данные на них переносит репликация; для локальной проверки с SQLite
+# достаточно скопировать db.sqlite3 после migrate.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, map(str.strip, os.getenv('DB_REPLICAS', default='').split(','))), 1):
+    alias = f'replica{number}'
+    if DATABASES['default']['ENGINE'] == 'foodgram.db.sqlite3':
+        location = {'NAME': BASE_DIR / replica}
+    else:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[alias] = {**DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Сколько секунд после записи пользователь и изменённые данные читаются
+# из default: должно быть не меньше задержки репликации.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=10))
+
+# Версии таблиц (recipes.versions), токены, счётчики страниц и привязки
+# к default хранятся в кэше default, поэтому он должен быть общим для
+# всех процессов: воркеров и manage.py, который тоже меняет данные.
+# По умолчанию это файловый кэш, общий для процессов одной машины;
+# для нескольких контейнеров - memcached, например
+# django.core.cache.backends.memcached.PyMemcacheCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=100000)),
+        },
+    },
+    # Готовые ответы API (api.response_cache), например файловый кэш
+    # django.core.cache.backends.filebased.FileBasedCache.
+    'responses': {
+        'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', default='responses'),
+    },
+    # Документы рецептов без личных отметок (api.documents).
+    'documents': {
+        'BACKEND': os.getenv('DOCUMENT_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DOCUMENT_CACHE_LOCATION', default='documents'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('DOCUMENT_CACHE_MAX_ENTRIES', default=10000)),
+        },
+    },
+}
+
+# Кэши, которые видит только свой процесс. С ними версии, отзыв токенов
+# и привязки к default не доходят до других процессов.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+SHARED_CACHE = CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+# Привязка к default после записи (api.replicas.pin_to_primary) хранится
+# в кэше: без общего кэша чтение в другом воркере ушло бы на отстающую
+# реплику.
+if DATABASE_REPLICAS and not SHARED_CACHE:
+    raise ImproperlyConfigured('DB_REPLICAS требует общего кэша default: задайте CACHE_BACKEND')
+
+DOCUMENT_CACHE_TIMEOUT = int(os.getenv('DOCUMENT_CACHE_TIMEOUT', default=24 * 60 * 60))
+
+# Токены авторизации (api.authentication): время жизни в общем кэше
+# и в локальном LRU процесса. Локальный срок ограничивает, насколько
+# другие процессы могут опоздать с отзывом токена; 0 отключает LRU.
+# В кэше default, который не общий (SHARED_CACHE), токены не хранятся.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=300))
+
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', default=5))
+
+AUTH_TOKEN_LOCAL_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_SIZE', default=1024))
+
+# Сколько секунд отозванный токен помечен в общем кэше, чтобы запрос,
+# прочитавший его из БД до отзыва, не вернул его в кэш.
+AUTH_TOKEN_REVOKED_TIMEOUT = int(os.getenv('AUTH_TOKEN_REVOKED_TIMEOUT', default=60))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=600))
+
+# Хранить рядом с ответом его gzip-копию и отдавать её клиентам,
+# которые принимают gzip.
+RESPONSE_CACHE_GZIP = os.getenv('RESPONSE_CACHE_GZIP', default='False').lower() == 'true'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -122,12 +236,54 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    # orjson, если установлен, с тем же выводом, что у JSONRenderer.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGINATE_BY_PARAM': 'limit',
 }
 
+# Замеры запросов (api.middleware.PerformanceMiddleware): заголовок
+# Server-Timing и лог запросов дольше SLOW_REQUEST_MS миллисекунд.
+PERFORMANCE_INSTRUMENTATION = os.getenv('PERFORMANCE_INSTRUMENTATION', default='False').lower() == 'true'
+
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default=500))
+
+# Файлы .prof запросов, выполненных сотрудниками с ?profile=return|store
+# или заголовком X-Profile.
+PROFILING_DIR = os.getenv('PROFILING_DIR', default=os.path.join(tempfile.gettempdir(), 'foodgram_profiles'))
+
+# Метрики Prometheus на /metrics. При нескольких воркерах gunicorn
+# задайте PROMETHEUS_MULTIPROC_DIR - общий каталог для их файлов
+# (в Dockerfile задан), gunicorn.conf.py очищает его при запуске.
+METRICS = os.getenv('METRICS', default='False').lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'api.serializers.UserSerializer',
@@ -0,0 +1,108 @@
+"""
+Настройки gunicorn: gunicorn -c gunicorn.conf.py.
+
+GUNICORN_WORKER_CLASS выбирает воркеры:
+sync - по процессу на запрос, gthread - потоки в каждом процессе
+(вместе с ними стоит включить пул соединений DB_POOL),
+uvicorn - асинхронные воркеры с foodgram.asgi.
+Число процессов и потоков считается от доступных ядер, если не
+задано GUNICORN_WORKERS и GUNICORN_THREADS.
+"""
+import os
+
+WORKER_CLASSES = {
+    'sync': ('sync', 'foodgram.wsgi:application'),
+    'gthread': ('gthread', 'foodgram.wsgi:application'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'foodgram.asgi:application'),
+}
+
+worker_type = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+if worker_type not in WORKER_CLASSES:
+    raise ValueError(
+        f'GUNICORN_WORKER_CLASS должен быть одним из '
+        f'{", ".join(WORKER_CLASSES)}, а не {worker_type}')
+worker_class, wsgi_app = WORKER_CLASSES[worker_type]
+
+# Настройки загружаются уже в мастере (on_starting), и воркеры
+# наследуют их вместе с окружением, поэтому ASYNC_VIEWS включается
+# здесь, до первой загрузки, а не только в foodgram.asgi.
+if worker_type == 'uvicorn':
+    os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+# Ядра, доступные процессу, а не все ядра машины.
+if hasattr(os, 'sched_getaffinity'):
+    cpus = len(os.sched_getaffinity(0))
+else:
+    cpus = os.cpu_count() or 1
+
+# Синхронный воркер простаивает, пока ждёт БД, поэтому их вдвое больше
+# ядер; потоковым и асинхронным хватает процесса на ядро.
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', 2 * cpus + 1 if worker_type == 'sync' else cpus))
+threads = int(os.getenv(
+    'GUNICORN_THREADS', 4 if worker_type == 'gthread' else 1))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Приложение загружается до fork, и воркеры делят его память
+# copy-on-write.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Воркер перезапускается после max_requests запросов, разброс jitter
+# не даёт всем воркерам перезапуститься одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Счётчики воркеров, в том числе WORKER_EXITS и WORKER_TIMEOUTS, живут
+# в файлах этого каталога и переживают воркер. prometheus_client
+# открывает их уже при импорте метрик, то есть до on_starting, когда
+# приложение загружается заранее.
+metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if metrics_dir:
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Версии таблиц, отзыв токенов и привязки к default хранятся в кэше
+    # default: воркеры с отдельными кэшами отдавали бы устаревшие данные.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+    if server.cfg.workers > 1 and not settings.SHARED_CACHE:
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured(
+            f'{server.cfg.workers} воркеров требуют общего кэша default, '
+            f'а не {settings.CACHES["default"]["BACKEND"]}: задайте '
+            f'CACHE_BACKEND или GUNICORN_WORKERS=1')
+    # Файлы метрик прошлого запуска исказили бы счётчики.
+    if metrics_dir:
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.db'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def pre_fork(server, worker):
+    # Соединения с БД, открытые мастером при загрузке приложения,
+    # не должны достаться воркерам общими на всех.
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def worker_abort(worker):
+    from api.metrics import WORKER_TIMEOUTS
+    WORKER_TIMEOUTS.inc()
+
+
+def worker_exit(server, worker):
+    from api.metrics import WORKER_EXITS
+    WORKER_EXITS.inc()
+
+
+def child_exit(server, worker):
+    # Gauge умершего воркера больше не учитываются в /metrics.
+    if metrics_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,54 +1,107 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
+from django.db import transaction
 
+from api.paginations import CachedCountPaginator
 from recipes.constants import ADMIN_INLINE_EXTRA
 from recipes.models import (
     AmountIngredient, Favorite, Ingredient,
     Recipe, ShoppingCart, Tag
 )
+from recipes.shopping_lists import get_recipe_amounts, recipe_amounts_changed
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка больших таблиц: count списка кэшируется или оценивается."""
+
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
 
 class IngredientInRecipeInline(admin.TabularInline):
     model = AmountIngredient
     extra = ADMIN_INLINE_EXTRA
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'name',
         'author',
-        'count_favorite'
+        'favorites_count'
     )
+    list_select_related = ('author',)
     fields = (
         ('name', 'tags',),
         ('text', 'cooking_time'),
         ('author', 'image'),
     )
+    autocomplete_fields = ('author',)
     search_fields = (
         'name',
         'author__username',
         'tags__name',
     )
-    list_filter = ('author', 'name', 'tags')
+    list_filter = ('tags',)
     inlines = [IngredientInRecipeInline]
     empty_value_display = '-пусто-'
 
-    def count_favorite(self, obj):
-        return obj.recipes_favorite_related.count()
+    def save_related(self, request, form, formsets, change):
+        old_amounts = get_recipe_amounts(form.instance.id) if change else {}
+        super().save_related(request, form, formsets, change)
+        recipe_amounts_changed(form.instance.id, old_amounts)
 
 
 @admin.register(AmountIngredient)
-class AmountIngredientAdmin(admin.ModelAdmin):
+class AmountIngredientAdmin(LargeTableAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe__author', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
     search_fields = ('recipe__name', 'ingredient__name')
 
+    @staticmethod
+    @contextmanager
+    def changing_recipes(recipe_ids):
+        """
+        Переносит изменение ингредиентов рецептов recipe_ids внутри
+        блока в списки покупок. Сохранение рецептов обновляет
+        updated_at и версии, от которых зависят ETag и документы.
+        """
+        old_amounts = {pk: get_recipe_amounts(pk) for pk in recipe_ids}
+        with transaction.atomic():
+            yield
+            for recipe_id, amounts in old_amounts.items():
+                recipe_amounts_changed(recipe_id, amounts)
+            for recipe in Recipe.objects.filter(pk__in=recipe_ids):
+                recipe.save(update_fields=('updated_at',))
+
+    def save_model(self, request, obj, form, change):
+        # Рецепт строки тоже можно поменять, тогда меняются оба.
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(AmountIngredient.objects.filter(
+                pk=obj.pk).values_list('recipe_id', flat=True))
+        with self.changing_recipes(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with self.changing_recipes({obj.recipe_id}):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with self.changing_recipes(
+                set(queryset.values_list('recipe_id', flat=True))):
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
     empty_value_display = '-пусто-'
 
 
@@ -61,12 +114,16 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name',)
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name',)
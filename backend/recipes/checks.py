@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии таблиц (recipes.versions) должны быть видны всем процессам:
+    иначе запись из manage.py, например load_data, не доходит до
+    сервера, и его индексы и ETag остаются старыми до перезапуска.
+    """
+    if settings.SHARED_CACHE:
+        return []
+    return [Error(
+        'Кэш default ({}) виден только своему процессу.'.format(
+            settings.CACHES['default']['BACKEND']),
+        hint='Задайте CACHE_BACKEND общим для процессов, например '
+             'FileBasedCache или PyMemcacheCache.',
+        id='recipes.E001',
+    )]
@@ -0,0 +1,45 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.versions import bump_version_on_commit
+from users.models import User
+
+
+def change_counter(model, pk, field, delta, **changes):
+    """
+    Атомарно меняет счётчик field объекта модели на delta и заодно
+    записывает поля changes. Счётчик не уходит ниже нуля, даже если
+    разошёлся с данными.
+    """
+    objects = model.objects.filter(pk=pk)
+    if delta < 0:
+        objects = objects.filter(**{f'{field}__gte': -delta})
+    objects.update(**{field: F(field) + delta}, **changes)
+
+
+def _count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        Value(0),
+    )
+
+
+def recount():
+    """Пересчитывает все счётчики по данным, возвращает число строк."""
+    updated = (
+        Recipe.objects.update(
+            favorites_count=_count(Favorite, 'recipe'),
+            in_carts_count=_count(ShoppingCart, 'recipe'),
+        )
+        + User.objects.update(recipes_count=_count(Recipe, 'author'))
+    )
+    bump_version_on_commit(Recipe)
+    bump_version_on_commit(User)
+    return updated
@@ -0,0 +1,224 @@
+import multiprocessing
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from tqdm import tqdm
+
+from recipes.counters import recount
+from recipes.models import (
+    AmountIngredient, Favorite, Ingredient,
+    Recipe, ShoppingCart, Tag
+)
+from recipes.shopping_lists import rebuild_shopping_lists
+from recipes.versions import bump_version_on_commit
+from users.models import Subscription, User
+
+# Размер куска работы. Не зависит от числа процессов, поэтому
+# при одном и том же seed данные получаются одинаковыми.
+SLICE_SIZE = 5000
+BATCH_SIZE = 1000
+PASSWORD = 'foodgram-fake'
+
+# План генерации, заполняется до запуска процессов и наследуется ими.
+plan = {}
+
+
+def zipf_cum_weights(size, skew):
+    """Накопленные веса закона Ципфа: первые элементы популярнее."""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(size)))
+
+
+def long_tail(rng, mean, limit):
+    """Случайное количество со средним mean и длинным хвостом."""
+    if mean <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / mean)), limit)
+
+
+def pick_distinct(rng, ids, cum_weights, count):
+    """count разных id, выбранных с весами cum_weights."""
+    count = min(count, len(ids))
+    picked = set()
+    while len(picked) < count:
+        picked.update(rng.choices(
+            ids, cum_weights=cum_weights, k=count - len(picked)))
+    return picked
+
+
+def generate_users(rng, start, stop):
+    User.objects.bulk_create(
+        (
+            User(id=pk, username=f'fake{pk}', email=f'fake{pk}@foodgram.fake',
+                 first_name=f'Имя{pk}', last_name=f'Фамилия{pk}',
+                 password=plan['password'])
+            for pk in range(start, stop)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def generate_recipes(rng, start, stop):
+    user_ids, tag_ids = plan['user_ids'], plan['tag_ids']
+    ingredient_ids = plan['ingredient_ids']
+    authors = rng.choices(
+        user_ids, cum_weights=plan['user_weights'], k=stop - start)
+    Recipe.objects.bulk_create(
+        (
+            Recipe(id=pk, author_id=author_id, name=f'Рецепт {pk}',
+                   text=f'Описание рецепта {pk}',
+                   cooking_time=rng.randint(5, 180),
+                   image='recipes/fake.png')
+            for pk, author_id in zip(range(start, stop), authors)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+            for pk in range(start, stop)
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    low, high = plan['ingredients_per_recipe']
+    AmountIngredient.objects.bulk_create(
+        (
+            AmountIngredient(recipe_id=pk, ingredient_id=ingredient_id,
+                             amount=rng.randint(1, 500))
+            for pk in range(start, stop)
+            for ingredient_id in rng.sample(
+                ingredient_ids, min(rng.randint(low, high),
+                                    len(ingredient_ids)))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def generate_relations(rng, start, stop):
+    user_ids, recipe_ids = plan['user_ids'], plan['recipe_ids']
+    relations = {Favorite: [], ShoppingCart: [], Subscription: []}
+    for user_id in range(start, stop):
+        for model, mean in ((Favorite, plan['favorites']),
+                            (ShoppingCart, plan['carts'])):
+            relations[model].extend(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in pick_distinct(
+                    rng, recipe_ids, plan['recipe_weights'],
+                    long_tail(rng, mean, len(recipe_ids) // 2))
+            )
+        relations[Subscription].extend(
+            Subscription(user_id=user_id, author_id=author_id)
+            for author_id in pick_distinct(
+                rng, user_ids, plan['user_weights'],
+                long_tail(rng, plan['subscriptions'], len(user_ids) // 2))
+            if author_id != user_id
+        )
+    for model, objs in relations.items():
+        model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+
+
+GENERATORS = {
+    'users': generate_users,
+    'recipes': generate_recipes,
+    'relations': generate_relations,
+}
+
+
+def run_slice(task):
+    phase, start, stop = task
+    GENERATORS[phase](
+        random.Random(f'{plan["seed"]}:{phase}:{start}'), start, stop)
+    return stop - start
+
+
+class Command(BaseCommand):
+    help = 'Generating fake users, recipes and their relations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 15),
+            metavar=('MIN', 'MAX'))
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число избранных рецептов пользователя.')
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Среднее число рецептов в списке покупок.')
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок пользователя.')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа для авторов и рецептов.')
+        parser.add_argument('--seed', default='foodgram')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов (только для PostgreSQL).')
+
+    def handle(self, *args, **options):
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not tag_ids or not ingredient_ids:
+            raise CommandError('Сначала загрузите теги и ингредиенты: '
+                               'python manage.py load_data')
+        first_user = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        first_recipe = (
+            Recipe.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        user_ids = list(range(first_user, first_user + options['users']))
+        recipe_ids = list(
+            range(first_recipe, first_recipe + options['recipes']))
+        plan.update(
+            seed=options['seed'],
+            password=make_password(PASSWORD),
+            tag_ids=tag_ids,
+            ingredient_ids=ingredient_ids,
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            user_ids=user_ids,
+            user_weights=zipf_cum_weights(len(user_ids), options['skew']),
+            recipe_ids=recipe_ids,
+            recipe_weights=zipf_cum_weights(
+                len(recipe_ids), options['skew']),
+            favorites=options['favorites'],
+            carts=options['carts'],
+            subscriptions=options['subscriptions'],
+        )
+        workers = options['workers']
+        if connection.vendor == 'sqlite':
+            workers = 1
+        for phase, ids in (('users', user_ids),
+                           ('recipes', recipe_ids),
+                           ('relations', user_ids)):
+            self.run_phase(phase, ids, workers)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Recipe]):
+                cursor.execute(sql)
+        rebuild_shopping_lists()
+        recount()
+        bump_version_on_commit(Subscription)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}. Пароль: {PASSWORD}'))
+
+    def run_phase(self, phase, ids, workers):
+        tasks = [
+            (phase, start, min(start + SLICE_SIZE, ids[-1] + 1))
+            for start in range(ids[0], ids[-1] + 1, SLICE_SIZE)
+        ] if ids else []
+        progress = tqdm(total=len(ids), desc=phase)
+        if workers > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                for done in pool.imap_unordered(run_slice, tasks):
+                    progress.update(done)
+        else:
+            for task in tasks:
+                progress.update(run_slice(task))
+        progress.close()
@@ -1,30 +1,190 @@
+import csv
 import json
+from io import StringIO
+from itertools import islice
 
 from tqdm import tqdm
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.constants import MAX_LEN_TITLE
 from recipes.models import Ingredient, Tag
+from recipes.versions import bump_version_on_commit
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+# Поля строк CSV по порядку, ключ для поиска существующих записей.
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+INGREDIENT_KEY = ('name', 'measurement_unit')
+TAG_FIELDS = ('name', 'slug', 'color')
+TAG_KEY = ('slug',)
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Читает JSON-массив объектов по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(f'{file.name}: ожидался JSON-массив')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError(f'{file.name}: некорректный JSON')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_rows(path, fields):
+    """Строки файла .json или .csv (без заголовка) в виде словарей."""
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            for row in csv.reader(file):
+                if row:
+                    yield dict(zip(fields, row))
+        else:
+            yield from iter_json_array(file)
+
+
+def batched(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def upsert(model, rows, key_fields, batch_size):
+    """
+    Добавляет новые строки и обновляет изменившиеся пачками по
+    batch_size. Возвращает число добавленных, обновлённых и пропущенных.
+    """
+    inserted = updated = skipped = 0
+    for batch in batched(rows, batch_size):
+        new_rows = {}
+        for row in batch:
+            key = tuple(row[field] for field in key_fields)
+            if key in new_rows:
+                skipped += 1
+            new_rows[key] = row
+        changed = []
+        for obj in model.objects.filter(**{
+            f'{key_fields[0]}__in': {key[0] for key in new_rows}
+        }):
+            row = new_rows.pop(
+                tuple(getattr(obj, field) for field in key_fields), None)
+            if row is None:
+                continue
+            if all(getattr(obj, field) == value
+                   for field, value in row.items()):
+                skipped += 1
+                continue
+            for field, value in row.items():
+                setattr(obj, field, value)
+            changed.append(obj)
+        if changed:
+            model.objects.bulk_update(
+                changed, {field for row in batch for field in row})
+        model.objects.bulk_create(
+            (model(**row) for row in new_rows.values()),
+            ignore_conflicts=True,
+        )
+        inserted += len(new_rows)
+        updated += len(changed)
+    return inserted, updated, skipped
+
+
+def copy_ingredients(rows, batch_size):
+    """
+    Загрузка ингредиентов в PostgreSQL через COPY во временную таблицу
+    и INSERT ... ON CONFLICT DO NOTHING из неё.
+    """
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_staging ('
+            f'name varchar({MAX_LEN_TITLE}), '
+            f'measurement_unit varchar({MAX_LEN_TITLE})'
+            ') ON COMMIT DROP'
+        )
+        for batch in batched(rows, batch_size):
+            buffer = StringIO()
+            csv.writer(buffer).writerows(
+                (row['name'], row['measurement_unit']) for row in batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            total += len(batch)
+        cursor.execute(
+            f'INSERT INTO {Ingredient._meta.db_table} '
+            '(name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_staging '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+        inserted = cursor.rowcount
+    return inserted, 0, total - inserted
 
 
 class Command(BaseCommand):
     help = 'Downloading ingredients and tags.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=f'{settings.BASE_DIR}/data/ingredients.json',
+            help='Файл ингредиентов .json или .csv.',
+        )
+        parser.add_argument(
+            '--tags',
+            default=f'{settings.BASE_DIR}/data/tags.json',
+            help='Файл тегов .json или .csv.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Размер пачки при записи в базу.',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY на PostgreSQL.',
+        )
+
+    @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Command start'))
-        with open(
-                f'{settings.BASE_DIR}/data/ingredients.json',
-                encoding='utf-8') as data_file_ingredients:
-            ingredient_data = json.loads(data_file_ingredients.read())
-            Ingredient.objects.bulk_create(
-                Ingredient(**ingredients)
-                for ingredients in tqdm(ingredient_data)
-            )
-
-        with open(
-                f'{settings.BASE_DIR}/data/tags.json',
-                encoding='utf-8') as data_file_tags:
-            tags_data = json.loads(data_file_tags.read())
-            Tag.objects.bulk_create(Tag(**tags) for tags in tqdm(tags_data))
-
+        batch_size = options['batch_size']
+        ingredients = tqdm(
+            read_rows(options['ingredients'], INGREDIENT_FIELDS))
+        if connection.vendor == 'postgresql' and not options['no_copy']:
+            stats = copy_ingredients(ingredients, batch_size)
+        else:
+            stats = upsert(
+                Ingredient, ingredients, INGREDIENT_KEY, batch_size)
+        bump_version_on_commit(Ingredient)
+        self.report(Ingredient, stats)
+        self.report(Tag, upsert(
+            Tag, tqdm(read_rows(options['tags'], TAG_FIELDS)),
+            TAG_KEY, batch_size
+        ))
+        bump_version_on_commit(Tag)
         self.stdout.write(self.style.SUCCESS('Данные загружены'))
+
+    def report(self, model, stats):
+        self.stdout.write(
+            '{}: добавлено {}, обновлено {}, пропущено {}'.format(
+                model._meta.verbose_name_plural, *stats))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_lists import find_mismatches, rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Rebuilding or verifying aggregated shopping lists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare stored shopping lists with the carts.',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+            return
+        created = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: {created} позиций'))
+
+    def verify(self):
+        mismatches = find_mismatches()
+        for (user_id, ingredient_id), (stored, expected) in list(
+                mismatches.items())[:20]:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{stored} вместо {expected}')
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Списки покупок совпадают'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Recounting favorites, shopping cart and recipe counters.'
+
+    def handle(self, *args, **options):
+        updated = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны: {updated} строк'))
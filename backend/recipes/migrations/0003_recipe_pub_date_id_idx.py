@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:23
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='amountingredient',
+            name='amount',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(limit_value=1, message='Минимальное значение 1!'), django.core.validators.MaxValueValidator(limit_value=10000, message='Максимальное значение 10000!')], verbose_name='Количество ингридиента'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(limit_value=1, message='Минимальное время 1 минута!'), django.core.validators.MaxValueValidator(limit_value=10000, message='Превысили максимальное время 10000 минут!')], verbose_name='Время приготовления (в минутах)'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+    ]
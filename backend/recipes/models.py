@@ -97,6 +97,10 @@ class Recipe(models.Model):
         auto_now_add=True,
         editable=False,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/',
@@ -115,11 +119,27 @@ class Recipe(models.Model):
                 message=f'Превысили максимальное время {MAX_AMOUNT} минут!'),
         ],
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+        )
         constraints = (
             models.CheckConstraint(
                 check=models.Q(name__length__gt=0),
@@ -217,3 +237,42 @@ class ShoppingCart(UserRecipeRelation):
     class Meta(UserRecipeRelation.Meta):
         verbose_name = 'Cписок покупок'
         verbose_name_plural = 'Cписоки покупок'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Model for the aggregated shopping list of a user.
+
+    Total amount of an ingredient over all recipes in the user's
+    shopping cart, maintained incrementally by recipes.shopping_lists.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    total_amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        )
+
+    def __str__(self):
+        return '{} {} {}'.format(self.user, self.ingredient, self.total_amount)
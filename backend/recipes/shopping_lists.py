@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from recipes.models import AmountIngredient, ShoppingCart, ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество каждого ингредиента рецепта: {id ингредиента: amount}."""
+    return dict(
+        AmountIngredient.objects.filter(recipe_id=recipe_id)
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def change_shopping_lists(user_ids, amounts):
+    """
+    Прибавляет amounts ({id ингредиента: изменение}) к спискам покупок
+    пользователей user_ids одним UPDATE с F() и удаляет обнулившиеся
+    позиции.
+    """
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    user_ids = list(user_ids)
+    if not user_ids or not amounts:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, amount in amounts.items() if amount > 0
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        items = ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts)
+        items.update(total_amount=F('total_amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(amount))
+                for ingredient_id, amount in amounts.items()
+            ),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        items.filter(total_amount__lte=0).delete()
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id):
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id):
+    change_shopping_lists([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+    })
+
+
+def recipe_amounts_changed(recipe_id, old_amounts):
+    """
+    Переносит изменение ингредиентов рецепта в списки покупок всех,
+    у кого он в корзине. old_amounts — результат get_recipe_amounts
+    до изменения.
+    """
+    new_amounts = get_recipe_amounts(recipe_id)
+    change_shopping_lists(
+        ShoppingCart.objects.filter(recipe_id=recipe_id)
+        .values_list('user_id', flat=True),
+        {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+    )
+
+
+def compute_shopping_lists(user_ids=None):
+    """Списки покупок, посчитанные заново по корзинам."""
+    if user_ids is None:
+        amounts = AmountIngredient.objects.filter(
+            recipe__recipes_shoppingcart_related__isnull=False)
+    else:
+        amounts = AmountIngredient.objects.filter(
+            recipe__recipes_shoppingcart_related__user__in=user_ids)
+    return (
+        amounts.values_list(
+            'recipe__recipes_shoppingcart_related__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    )
+
+
+def find_mismatches():
+    """
+    Расхождения сохранённых списков покупок с корзинами:
+    {(id пользователя, id ингредиента): (сохранено, должно быть)}.
+    """
+    expected = {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount
+        in compute_shopping_lists().iterator()
+    }
+    stored = {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount
+        in ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount').iterator()
+    }
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in expected.keys() | stored.keys()
+        if expected.get(key) != stored.get(key)
+    }
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids=None):
+    """Пересоздаёт списки покупок из корзин, возвращает число позиций."""
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    return len(ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             total_amount=total_amount)
+            for user_id, ingredient_id, total_amount
+            in compute_shopping_lists(user_ids).iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    ))
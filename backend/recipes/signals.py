@@ -0,0 +1,122 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.counters import change_counter
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.shopping_lists import (
+    add_recipe_to_shopping_list, remove_recipe_from_shopping_list
+)
+from recipes.versions import bump_version_on_commit
+from users.models import Subscription, User
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Subscription)
+def bump_table_version(sender, **kwargs):
+    bump_version_on_commit(sender)
+
+
+def bump_recipe_version(recipe_id):
+    bump_version_on_commit(Recipe)
+    bump_version_on_commit(Recipe, recipe_id)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe_version(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, created, update_fields, **kwargs):
+    # Новые пользователи и вход (last_login) не меняют ответы API.
+    if not created and update_fields != frozenset(('last_login',)):
+        bump_version_on_commit(sender)
+        bump_version_on_commit(sender, instance.pk)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+def remember_relation(sender, instance, **kwargs):
+    # Пользователя и рецепт строки можно сменить в админке.
+    instance._old_relation = None
+    if instance.pk:
+        instance._old_relation = sender.objects.filter(
+            pk=instance.pk).values_list('user_id', 'recipe_id').first()
+
+
+def get_old_relation(instance):
+    """(user_id, recipe_id) до сохранения, если они изменились."""
+    old = getattr(instance, '_old_relation', None)
+    if old and old != (instance.user_id, instance.recipe_id):
+        return old
+    return None
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    old = get_old_relation(instance)
+    if old:
+        remove_recipe_from_shopping_list(*old)
+    if created or old:
+        add_recipe_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    remove_recipe_from_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_author(sender, instance, update_fields, **kwargs):
+    # Автора можно сменить в админке, тогда счётчики меняются у обоих.
+    instance._old_author_id = None
+    if instance.pk and (update_fields is None or 'author' in update_fields):
+        instance._old_author_id = sender.objects.filter(
+            pk=instance.pk).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    old_author_id = getattr(instance, '_old_author_id', None)
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+    elif old_author_id and old_author_id != instance.author_id:
+        change_counter(User, old_author_id, 'recipes_count', -1)
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    old = get_old_relation(instance)
+    moved = old and old[1] != instance.recipe_id
+    if moved:
+        change_counter(Recipe, old[1], RECIPE_COUNTERS[sender], -1,
+                       updated_at=timezone.now())
+        bump_recipe_version(old[1])
+    if created or moved:
+        change_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender], 1,
+                       updated_at=timezone.now())
+        bump_recipe_version(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender], -1,
+                   updated_at=timezone.now())
+    bump_recipe_version(instance.recipe_id)
@@ -0,0 +1,82 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+MODIFIED_KEY = 'modified:{}'
+
+
+def _label(model, pk):
+    label = model._meta.label_lower
+    return label if pk is None else f'{label}:{pk}'
+
+
+def _version_key(model, pk=None):
+    return VERSION_KEY.format(_label(model, pk))
+
+
+def _modified_key(model, pk=None):
+    return MODIFIED_KEY.format(_label(model, pk))
+
+
+def get_version(model, pk=None):
+    """
+    Текущая версия таблицы модели или, если передан pk, одного объекта.
+
+    Хранится в кэше default, общем для всех процессов (проверка
+    recipes.E001), поэтому запись из manage.py видна серверу.
+    Начальное значение берётся из часов, чтобы после вытеснения ключа
+    версия не повторилась.
+    """
+    key = _version_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(model, pks):
+    """Версии нескольких объектов модели одним обращением к кэшу."""
+    keys = {pk: _version_key(model, pk) for pk in pks}
+    versions = cache.get_many(keys.values())
+    for key in keys.values():
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return {pk: versions[key] for pk, key in keys.items()}
+
+
+def get_last_modified(model, pk=None):
+    """
+    Время последней записи в таблицу модели или объект (unix timestamp).
+
+    Если оно неизвестно, например после очистки кэша, считается,
+    что таблица изменилась только что.
+    """
+    key = _modified_key(model, pk)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, int(time.time()), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_version(model, pk=None):
+    """Меняет версию таблицы модели или объекта после записи в них."""
+    cache.set(_modified_key(model, pk), int(time.time()), timeout=None)
+    key = _version_key(model, pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+
+
+def bump_version_on_commit(model, pk=None):
+    """
+    Меняет версию после фиксации транзакции, чтобы другие процессы
+    не связали новую версию со старыми данными.
+    """
+    transaction.on_commit(lambda: bump_version(model, pk))
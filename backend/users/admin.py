@@ -1,9 +1,10 @@
 from django.contrib import admin
 
+from recipes.admin import LargeTableAdmin
 from .models import User
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('pk', 'username', 'first_name', 'last_name', 'email')
     search_fields = ('username', 'email',)
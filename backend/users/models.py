@@ -36,6 +36,11 @@ class User(AbstractUser):
         'Фамилия',
         max_length=MAX_LEN_NAME,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Пользователь'